@@ -27,6 +27,9 @@ python -m pip install -r requirements.txt --quiet
 source /opt/star_burger_2/.env
 
 DATABASE_URL=$DATABASE_URL python manage.py migrate
+DATABASE_URL=$DATABASE_URL python manage.py createcachetable
+DATABASE_URL=$DATABASE_URL python manage.py copy_banner_images
+DATABASE_URL=$DATABASE_URL python manage.py rekey_locations
 DATABASE_URL=$DATABASE_URL python manage.py collectstatic --noinput --clear -v 0
 
 # services
@@ -118,6 +118,49 @@ class ProductCategoryAdmin(admin.ModelAdmin):
     pass
 
 
+@admin.register(Banner)
+class BannerAdmin(admin.ModelAdmin):
+    list_display = [
+        'get_image_list_preview',
+        'title',
+        'order',
+        'active_from',
+        'active_until',
+    ]
+    list_display_links = [
+        'title',
+    ]
+    list_editable = [
+        'order',
+    ]
+    readonly_fields = [
+        'get_image_preview',
+    ]
+    fields = [
+        'title',
+        'text',
+        'image',
+        'get_image_preview',
+        'order',
+        'active_from',
+        'active_until',
+    ]
+
+    def get_image_preview(self, obj):
+        if not obj.image:
+            return 'выберите картинку'
+        return format_html('<img src="{url}" style="max-height: 200px;"/>', url=obj.image.url)
+
+    get_image_preview.short_description = 'превью'
+
+    def get_image_list_preview(self, obj):
+        if not obj.image:
+            return 'нет картинки'
+        return format_html('<img src="{src}" style="max-height: 50px;"/>', src=obj.image.url)
+
+    get_image_list_preview.short_description = 'превью'
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     inlines = [OrderProductInline]
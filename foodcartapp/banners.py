@@ -0,0 +1,64 @@
+import bisect
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from . import fast_json
+from .models import Banner
+
+BANNERS_KEY = 'foodcartapp:banners'
+
+
+def build_banner_payloads(now=None):
+    """Serialize the banner list for now and for every upcoming window change.
+
+    Returns [(starts_at_timestamp, content, etag)] sorted by start time,
+    each payload is valid until the next one starts. Scheduled banners
+    therefore appear and disappear without reading the database again.
+    """
+    now = now or timezone.now()
+    banners = list(
+        Banner.objects.filter(Q(active_until__isnull=True) | Q(active_until__gt=now))
+    )
+    moments = {now}
+    for banner in banners:
+        moments.update(
+            moment for moment in (banner.active_from, banner.active_until)
+            if moment and moment > now
+        )
+
+    payloads = []
+    for starts_at in sorted(moments):
+        content = fast_json.dumps([
+            {
+                'title': banner.title,
+                'src': banner.image.url,
+                'text': banner.text,
+            }
+            for banner in banners if banner.is_active(starts_at)
+        ])
+        etag = f'"{hashlib.sha256(content).hexdigest()}"'
+        payloads.append((starts_at.timestamp(), content, etag))
+    return payloads
+
+
+def get_banner_payload(now=None):
+    """Return (content, etag, seconds until the banner list changes or None)."""
+    now = (now or timezone.now()).timestamp()
+    payloads = cache.get(BANNERS_KEY)
+    if payloads is None:
+        payloads = build_banner_payloads()
+        cache.set(BANNERS_KEY, payloads, timeout=settings.CATALOG_CACHE_TIMEOUT)
+
+    starts = [starts_at for starts_at, _, _ in payloads]
+    position = max(bisect.bisect_right(starts, now) - 1, 0)
+    _, content, etag = payloads[position]
+    expires_in = starts[position + 1] - now if position + 1 < len(starts) else None
+    return content, etag, expires_in
+
+
+def invalidate_banners():
+    cache.delete(BANNERS_KEY)
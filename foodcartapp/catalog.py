@@ -0,0 +1,26 @@
+import uuid
+
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'foodcartapp:catalog_version'
+
+
+def get_catalog_version():
+    """Token that changes whenever products, categories or menus change.
+
+    Responses built from the catalog are cached under it. With a shared
+    cache (CACHE_URL) every process sees a bump made by any of them; with
+    the default per-process one the others keep their version, and their
+    responses expire after the short default CATALOG_CACHE_TIMEOUT.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    version = uuid.uuid4().hex
+    cache.set(CATALOG_VERSION_KEY, version, timeout=None)
+    return version
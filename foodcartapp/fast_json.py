@@ -0,0 +1,25 @@
+import json
+
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(data):
+    """Serialize to compact UTF-8 JSON bytes, with orjson when it is installed.
+
+    Only plain JSON types are accepted: convert Decimal and other special
+    values beforehand, so no per-object encoder hook is needed.
+    """
+    if orjson:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class FastJsonResponse(HttpResponse):
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
@@ -0,0 +1,48 @@
+import hashlib
+
+from django.db import IntegrityError, transaction
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+
+
+def hash_request(body):
+    return hashlib.sha256(body).hexdigest()
+
+
+def find_idempotency_key(key):
+    """Return the unexpired IdempotencyKey row for the key, or None."""
+    saved_key = IdempotencyKey.objects.filter(key=key).first()
+    if saved_key and not saved_key.is_expired():
+        return saved_key
+    return None
+
+
+def claim_idempotency_key(key, request_hash):
+    """Return (IdempotencyKey, created) for the key.
+
+    Must be called inside the transaction that creates the order. The new
+    row is committed or rolled back together with the order. A concurrent
+    request with the same key blocks on the unique index until the first
+    one finishes, then gets its row and its saved response.
+    """
+    saved_key = IdempotencyKey.objects.filter(key=key).first()
+    if saved_key:
+        if not saved_key.is_expired():
+            return saved_key, False
+        saved_key.delete()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(key=key, request_hash=request_hash), True
+    except IntegrityError:
+        return IdempotencyKey.objects.get(key=key), False
+
+
+def delete_expired_idempotency_keys(batch_size):
+    """Delete up to batch_size expired keys, return how many were deleted."""
+    expired_ids = list(
+        IdempotencyKey.objects.expired().values_list('pk', flat=True)[:batch_size]
+    )
+    IdempotencyKey.objects.filter(pk__in=expired_ids).delete()
+    return len(expired_ids)
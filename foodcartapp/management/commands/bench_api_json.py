@@ -0,0 +1,53 @@
+import json
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from foodcartapp import fast_json
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает прежнюю сериализацию меню в JSON с компактной'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        randomizer = random.Random(options['seed'])
+        products = [
+            {
+                'id': number,
+                'name': f'Бургер №{number}',
+                'price': Decimal(randomizer.randrange(10000, 100000)) / 100,
+                'special_status': randomizer.random() < 0.2,
+                'description': 'Сочная котлета из говядины, сыр чеддер, свежие овощи и фирменный соус',
+                'category': {'id': number % 5, 'name': 'Бургеры'},
+                'image': f'/media/burger_{number}.jpg',
+                'restaurant': {'id': number, 'name': f'Бургер №{number}'},
+            }
+            for number in range(options['products'])
+        ]
+
+        def dump_indented():
+            return json.dumps(products, cls=DjangoJSONEncoder, ensure_ascii=False, indent=4).encode()
+
+        def dump_compact():
+            prepared = [dict(product, price=str(product['price'])) for product in products]
+            return fast_json.dumps(prepared)
+
+        backend = 'orjson' if fast_json.orjson else 'json'
+        self.stdout.write(f'{len(products)} товаров, {options["repeat"]} повторов, бэкенд {backend}')
+        for title, dump in [('с отступами', dump_indented), ('компактно', dump_compact)]:
+            content = dump()
+            started_at = time.perf_counter()
+            for _ in range(options['repeat']):
+                dump()
+            elapsed = time.perf_counter() - started_at
+            self.stdout.write(
+                f'{title}: {len(content)} байт, {elapsed / options["repeat"] * 1e6:.0f} мкс на запрос'
+            )
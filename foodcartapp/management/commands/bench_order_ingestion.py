@@ -0,0 +1,102 @@
+import json
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory, override_settings
+
+from foodcartapp.menu_index import get_menu_index
+from foodcartapp.models import Order, PendingOrder
+from foodcartapp.order_spool import create_pending_orders
+from foodcartapp.views import register_order
+from location.models import PendingAddress
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает приём заказов сразу в БД и через очередь при параллельных клиентах. ' \
+           'Созданные заказы удаляются после замера'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=50)
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--lines', type=int, default=3, help='позиций в заказе')
+        parser.add_argument('--batch-size', type=int, default=200, help='размер пачки обработчика очереди')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        product_ids = sorted(get_menu_index().available_product_ids())
+        if not product_ids:
+            raise CommandError('Нет товаров в продаже, заказывать нечего')
+
+        randomizer = random.Random(options['seed'])
+        marker = f'bench-{uuid.uuid4().hex[:8]}'
+        address = f'Москва, {marker}'
+        bodies = [
+            json.dumps({
+                'firstname': 'Нагрузочный',
+                'lastname': marker,
+                'phonenumber': '+79001234567',
+                'address': address,
+                'products': [
+                    {'product': product_id, 'quantity': randomizer.randint(1, 3)}
+                    for product_id in randomizer.sample(product_ids, min(options['lines'], len(product_ids)))
+                ],
+            })
+            for _ in range(options['orders'])
+        ]
+
+        try:
+            for title, spool in [('сразу в БД', False), ('через очередь', True)]:
+                with override_settings(ORDERS_SPOOL=spool):
+                    elapsed, statuses = self.post_orders(bodies, options['clients'])
+                accepted = sum(status in (200, 202) for status in statuses)
+                self.stdout.write(
+                    f'{title}: {accepted} из {len(bodies)} приняты за {elapsed:.2f} с, '
+                    f'{accepted / elapsed:.0f} заказов/с, ошибки: {self.count_errors(statuses)}'
+                )
+                if spool:
+                    started_at = time.perf_counter()
+                    created = 0
+                    while True:
+                        processed, batch_created = create_pending_orders(options['batch_size'])
+                        created += batch_created
+                        if not processed:
+                            break
+                    drain_time = time.perf_counter() - started_at
+                    self.stdout.write(
+                        f'обработчик очереди: {created} заказов за {drain_time:.2f} с, '
+                        f'{created / drain_time:.0f} заказов/с'
+                    )
+        finally:
+            PendingOrder.objects.filter(payload__lastname=marker).delete()
+            Order.objects.filter(lastname=marker).delete()
+            PendingAddress.objects.filter(address=address).delete()
+
+    @staticmethod
+    def post_orders(bodies, clients):
+        factory = RequestFactory()
+
+        def post_order(body):
+            try:
+                request = factory.post('/api/order/', body, content_type='application/json')
+                return register_order(request).status_code
+            except Exception as error:
+                return type(error).__name__
+            finally:
+                connection.close()
+
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            statuses = list(executor.map(post_order, bodies))
+        return time.perf_counter() - started_at, statuses
+
+    @staticmethod
+    def count_errors(statuses):
+        errors = {}
+        for status in statuses:
+            if status not in (200, 202):
+                errors[status] = errors.get(status, 0) + 1
+        return ', '.join(f'{status}: {count}' for status, count in errors.items()) or 'нет'
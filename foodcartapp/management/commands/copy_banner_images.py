@@ -0,0 +1,28 @@
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from foodcartapp.models import Banner
+
+
+class Command(BaseCommand):
+    help = 'Копирует в медиафайлы картинки баннеров, которые лежат в assets, если их там ещё нет'
+
+    def handle(self, *args, **options):
+        copied = 0
+        for banner in Banner.objects.exclude(image=''):
+            if default_storage.exists(banner.image.name):
+                continue
+            source_path = os.path.join(settings.BASE_DIR, 'assets', os.path.basename(banner.image.name))
+            if not os.path.exists(source_path):
+                self.stderr.write(f'Нет картинки для баннера «{banner.title}»: {banner.image.name}')
+                continue
+            with open(source_path, 'rb') as source:
+                saved_name = default_storage.save(banner.image.name, File(source))
+            if saved_name != banner.image.name:
+                Banner.objects.filter(pk=banner.pk).update(image=saved_name)
+            copied += 1
+        self.stdout.write(f'Скопировано картинок: {copied}')
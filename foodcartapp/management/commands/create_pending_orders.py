@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodcartapp.order_spool import create_pending_orders
+
+
+class Command(BaseCommand):
+    help = 'Создаёт заказы, принятые API в очередь, пачками в одной транзакции'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--interval', type=float, default=1, help='пауза между проверками очереди, сек')
+        parser.add_argument('--once', action='store_true', help='разобрать очередь и выйти')
+
+    def handle(self, *args, **options):
+        while True:
+            processed, created = create_pending_orders(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Обработано заказов: {processed}, создано: {created}')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
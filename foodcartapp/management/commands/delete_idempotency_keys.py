@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodcartapp.idempotency import delete_expired_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = 'Удаляет ключи идемпотентности заказов старше IDEMPOTENCY_KEY_TTL часов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--interval', type=float, default=600, help='пауза между проверками, сек')
+        parser.add_argument('--once', action='store_true', help='удалить устаревшие ключи и выйти')
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = delete_expired_idempotency_keys(options['batch_size'])
+            if deleted:
+                self.stdout.write(f'Удалено ключей: {deleted}')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
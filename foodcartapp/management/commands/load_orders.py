@@ -0,0 +1,61 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import reset_queries
+
+from foodcartapp.models import Product
+from foodcartapp.order_loader import read_orders, save_orders
+
+
+class Command(BaseCommand):
+    help = 'Загружает заказы из файла JSONL: по заказу в формате POST /api/order/ на строку'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='файл JSONL, «-» — читать из stdin')
+        parser.add_argument('--batch-size', type=int, default=5000, help='заказов в одной транзакции')
+
+    def handle(self, *args, **options):
+        products_by_id = Product.objects.in_bulk()
+        batch_size = options['batch_size']
+
+        started_at = time.perf_counter()
+        orders_count = lines_count = rejected_count = 0
+        with self.open_input(options['path']) as lines:
+            batch = []
+            for line_number, validated_data, errors in read_orders(lines, products_by_id):
+                if errors:
+                    rejected_count += 1
+                    self.stderr.write(f'строка {line_number}: {json.dumps(errors, ensure_ascii=False)}')
+                    continue
+                batch.append(validated_data)
+                if len(batch) >= batch_size:
+                    orders_count, lines_count = self.save_batch(batch, orders_count, lines_count, started_at)
+                    batch = []
+            if batch:
+                orders_count, lines_count = self.save_batch(batch, orders_count, lines_count, started_at)
+
+        elapsed = time.perf_counter() - started_at
+        self.stdout.write(
+            f'Загружено заказов: {orders_count}, позиций: {lines_count}, отклонено строк: {rejected_count} '
+            f'за {elapsed:.1f} с, {(orders_count + lines_count) / elapsed:.0f} строк БД/с'
+        )
+
+    def save_batch(self, batch, orders_count, lines_count, started_at):
+        saved_orders, saved_lines = save_orders(batch)
+        reset_queries()
+        orders_count += saved_orders
+        lines_count += saved_lines
+        elapsed = time.perf_counter() - started_at
+        self.stdout.write(
+            f'заказов: {orders_count}, позиций: {lines_count}, '
+            f'{(orders_count + lines_count) / elapsed:.0f} строк БД/с'
+        )
+        return orders_count, lines_count
+
+    @staticmethod
+    def open_input(path):
+        if path == '-':
+            return open(sys.stdin.fileno(), encoding='utf-8', closefd=False)
+        return open(path, encoding='utf-8')
@@ -0,0 +1,176 @@
+import itertools
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.test import Client
+from django.utils import timezone
+
+LOCK_ERROR_MARKERS = ['database is locked', 'database table is locked', 'deadlock detected',
+                      'lock timeout', 'could not obtain lock']
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест приёма заказов: повторяет заказы из JSONL на POST /api/order/. ' \
+           'Заказы остаются в базе, запускайте на отдельной БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='файл JSONL, по заказу в формате POST /api/order/ на строку')
+        parser.add_argument('--requests', type=int, default=1000,
+                            help='сколько заказов отправить, файл повторяется по кругу')
+        parser.add_argument('--concurrency', type=int, default=50, help='параллельных клиентов')
+        parser.add_argument('--rate', type=float, help='заказов в секунду; без него клиенты шлют заказы без пауз')
+        parser.add_argument('--url', help='адрес запущенного сервера, например http://127.0.0.1:8000/api/order/; '
+                                          'без него запросы идут через тестовый клиент Django в этом процессе')
+        parser.add_argument('--slow-statement-ms', type=float, default=100,
+                            help='запросы к БД дольше этого считаются медленными, например из-за ожидания блокировки')
+        parser.add_argument('--output', help='куда записать результаты в JSON')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.slow_statement_time = options['slow_statement_ms'] / 1000
+        self.local = threading.local()
+        self.stats_lock = threading.Lock()
+        self.slow_statements = 0
+
+        bodies = itertools.islice(self.read_bodies(options['path']), options['requests'])
+        started_at = time.perf_counter()
+        rate = options['rate']
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            results = list(executor.map(
+                lambda numbered_body: self.send(
+                    numbered_body[1],
+                    started_at + numbered_body[0] / rate if rate else None,
+                ),
+                enumerate(bodies),
+            ))
+        duration = time.perf_counter() - started_at
+        if not results:
+            raise CommandError('В файле нет заказов')
+
+        report = self.build_report(results, duration)
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def read_bodies(path):
+        while True:
+            found = False
+            with open(path, encoding='utf-8') as lines:
+                for line in lines:
+                    if line.strip():
+                        found = True
+                        yield line
+            if not found:
+                return
+
+    def send(self, body, scheduled_at):
+        """Post one order, return (latency_s, error or None, failed on a DB lock).
+
+        With a target rate latency counts from the scheduled send time, so
+        requests queued behind slow ones are not reported as fast.
+        """
+        if scheduled_at:
+            time.sleep(max(scheduled_at - time.perf_counter(), 0))
+        started_at = scheduled_at or time.perf_counter()
+        locked = False
+        try:
+            status = self.post(body)
+            error = None if 200 <= status < 300 else f'HTTP {status}'
+        except Exception as exception:
+            error = f'{type(exception).__name__}: {str(exception)[:80]}'
+            locked = isinstance(exception, OperationalError) \
+                and any(marker in str(exception) for marker in LOCK_ERROR_MARKERS)
+        return time.perf_counter() - started_at, error, locked
+
+    def post(self, body):
+        if self.options['url']:
+            if not hasattr(self.local, 'session'):
+                self.local.session = requests.Session()
+            response = self.local.session.post(
+                self.options['url'],
+                data=body.encode(),
+                headers={'Content-Type': 'application/json'},
+                timeout=30,
+            )
+            return response.status_code
+
+        if not hasattr(self.local, 'client'):
+            host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if '*' not in host), 'localhost')
+            self.local.client = Client(HTTP_HOST=host)
+        with connection.execute_wrapper(self.count_slow_statements):
+            response = self.local.client.post('/api/order/', body, content_type='application/json')
+        return response.status_code
+
+    def count_slow_statements(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if time.perf_counter() - started_at >= self.slow_statement_time:
+                with self.stats_lock:
+                    self.slow_statements += 1
+
+    def build_report(self, results, duration):
+        latencies = sorted(latency for latency, _, _ in results)
+        errors = {}
+        for _, error, _ in results:
+            if error:
+                errors[error] = errors.get(error, 0) + 1
+        succeeded = len(results) - sum(errors.values())
+
+        def percentile(share):
+            # Nearest-rank: the smallest latency at least `share` of requests did not exceed
+            return round(latencies[max(math.ceil(len(latencies) * share) - 1, 0)] * 1000, 2)
+
+        return {
+            'finished_at': timezone.now().isoformat(),
+            'target': self.options['url'] or 'in-process',
+            'database': connection.vendor,
+            'orders_spool': settings.ORDERS_SPOOL,
+            'concurrency': self.options['concurrency'],
+            'rate': self.options['rate'],
+            'requests': len(results),
+            'succeeded': succeeded,
+            'duration_s': round(duration, 3),
+            'throughput_rps': round(succeeded / duration, 1),
+            'latency_ms': {
+                'p50': percentile(0.50),
+                'p95': percentile(0.95),
+                'p99': percentile(0.99),
+                'max': round(latencies[-1] * 1000, 2),
+            },
+            'errors': errors,
+            'lock_errors': sum(locked for _, _, locked in results),
+            'slow_statements': {
+                'count': None if self.options['url'] else self.slow_statements,
+                'threshold_ms': self.options['slow_statement_ms'],
+            },
+        }
+
+    def print_report(self, report):
+        latency = report['latency_ms']
+        self.stdout.write(
+            f'{report["target"]}, {report["database"]}: {report["succeeded"]} из {report["requests"]} '
+            f'за {report["duration_s"]} с, {report["throughput_rps"]} заказов/с\n'
+            f'задержка, мс: p50 {latency["p50"]}, p95 {latency["p95"]}, p99 {latency["p99"]}, '
+            f'максимум {latency["max"]}'
+        )
+        for error, count in sorted(report['errors'].items(), key=lambda item: -item[1]):
+            self.stdout.write(f'{count} × {error}')
+        self.stdout.write(f'запросов с ошибкой блокировки БД: {report["lock_errors"]}')
+        slow_statements = report['slow_statements']
+        if slow_statements['count'] is not None:
+            self.stdout.write(
+                f'запросов к БД дольше {slow_statements["threshold_ms"]} мс '
+                f'(в том числе ждавших блокировку): {slow_statements["count"]}'
+            )
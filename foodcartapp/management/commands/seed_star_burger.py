@@ -0,0 +1,82 @@
+import random
+import time
+from datetime import datetime, time as day_time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from foodcartapp.models import Order
+from foodcartapp.synthetic import address_pool, create_catalog, create_locations, create_orders
+
+PROGRESS_EVERY = 100_000
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими ресторанами, товарами, локациями и историей заказов. ' \
+           'Одинаковый --seed даёт одинаковые данные'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--restaurants', type=int, default=100)
+        parser.add_argument('--products', type=int, default=300)
+        parser.add_argument('--addresses', type=int, default=20_000, help='адресов доставки с координатами')
+        parser.add_argument('--orders', type=int, default=1_700_000, help='выполненных и отменённых заказов')
+        parser.add_argument('--open-orders', type=int, default=500, help='необработанных заказов для менеджера')
+        parser.add_argument('--lines', type=int, default=3, help='позиций в заказе')
+        parser.add_argument('--days', type=int, default=365, help='за сколько дней до --until разбросать заказы')
+        parser.add_argument('--until', type=datetime.fromisoformat,
+                            help='дата последнего заказа, ГГГГ-ММ-ДД; по умолчанию сегодня')
+        parser.add_argument('--batch-size', type=int, default=5000, help='заказов в одной транзакции')
+
+    def handle(self, *args, **options):
+        started_at = time.perf_counter()
+        randomizer = random.Random(options['seed'])
+        until = options['until'] or datetime.combine(timezone.localdate(), day_time())
+        if timezone.is_naive(until):
+            until = timezone.make_aware(until)
+        history_seconds = options['days'] * 24 * 60 * 60
+
+        restaurant_ids, product_prices = create_catalog(
+            randomizer, options['restaurants'], options['products'], batch_size=options['batch_size'],
+        )
+        addresses = address_pool(options['addresses'])
+        create_locations(addresses, batch_size=options['batch_size'])
+        self.stdout.write(
+            f'ресторанов: {len(restaurant_ids)}, товаров: {len(product_prices)}, '
+            f'адресов: {len(addresses)}, {time.perf_counter() - started_at:.1f} с'
+        )
+
+        def build_finished_order(randomizer, order):
+            order.registered_at = until - timedelta(seconds=randomizer.uniform(0, history_seconds))
+            order.called_at = order.registered_at + timedelta(minutes=randomizer.uniform(1, 15))
+            order.payment_method = randomizer.choice(Order.PaymentMethods.values)
+            order.restaurant_to_cook_id = randomizer.choice(restaurant_ids)
+            if randomizer.random() < 0.05:
+                order.status = Order.OrderStatuses.CANCELED
+            else:
+                order.status = Order.OrderStatuses.FINISHED
+                order.delivered_at = order.called_at + timedelta(minutes=randomizer.uniform(20, 90))
+
+        def build_open_order(randomizer, order):
+            order.registered_at = until - timedelta(minutes=randomizer.uniform(0, 120))
+
+        lines_count = 0
+        for chunk_start in range(0, options['orders'], PROGRESS_EVERY):
+            chunk = min(PROGRESS_EVERY, options['orders'] - chunk_start)
+            lines_count += create_orders(
+                randomizer, chunk, options['lines'], product_prices, addresses,
+                batch_size=options['batch_size'], build_order=build_finished_order,
+            )
+            elapsed = time.perf_counter() - started_at
+            self.stdout.write(
+                f'заказов: {chunk_start + chunk}, позиций: {lines_count}, '
+                f'{elapsed:.0f} с, {lines_count / elapsed:.0f} позиций/с'
+            )
+        lines_count += create_orders(
+            randomizer, options['open_orders'], options['lines'], product_prices, addresses,
+            batch_size=options['batch_size'], build_order=build_open_order,
+        )
+        self.stdout.write(
+            f'Готово: заказов {options["orders"] + options["open_orders"]}, позиций {lines_count} '
+            f'за {time.perf_counter() - started_at:.0f} с'
+        )
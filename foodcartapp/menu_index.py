@@ -0,0 +1,161 @@
+import threading
+import time
+
+from django.conf import settings
+
+from location.models import Location
+from location.normalization import normalize_address
+from location.spatial import GridIndex
+
+from .catalog import get_catalog_version
+from .models import Restaurant, RestaurantMenuItem
+
+
+class MenuIndex:
+    """Which restaurants have each product available.
+
+    Every restaurant gets a bit position, every product maps to an int
+    used as a bitset of restaurants that sell it. Intersecting the bitsets
+    of an order's products gives restaurants able to cook the whole order.
+
+    Restaurants with known coordinates are also put in a spatial grid to
+    find the nearest of them without measuring the distance to every one.
+
+    The index remembers the catalog version it was built for, so a menu
+    change saved by another process makes it stale here as well.
+    """
+
+    def __init__(self, restaurants, menu_items, restaurant_coords, version, catalog_version):
+        self.version = version
+        self.catalog_version = catalog_version
+        self.built_at = time.monotonic()
+        self.restaurants = list(restaurants)
+        self.positions = {
+            restaurant.id: position for position, restaurant in enumerate(self.restaurants)
+        }
+        self.restaurants_by_id = {restaurant.id: restaurant for restaurant in self.restaurants}
+        self.address_keys = {normalize_address(restaurant.address) for restaurant in self.restaurants}
+        self.locations = GridIndex(
+            (restaurant_id, latitude, longitude)
+            for restaurant_id, (latitude, longitude) in restaurant_coords.items()
+        )
+        self.products = {}
+        for restaurant_id, product_id in menu_items:
+            self.products[product_id] = (
+                self.products.get(product_id, 0) | 1 << self.positions[restaurant_id]
+            )
+
+    def set_availability(self, restaurant_id, product_id, available):
+        bit = 1 << self.positions[restaurant_id]
+        restaurants_mask = self.products.get(product_id, 0)
+        restaurants_mask = restaurants_mask | bit if available else restaurants_mask & ~bit
+        if restaurants_mask:
+            self.products[product_id] = restaurants_mask
+        else:
+            self.products.pop(product_id, None)
+
+    def is_available(self, product_id):
+        return product_id in self.products
+
+    def available_product_ids(self):
+        return list(self.products)
+
+    def restaurants_can_cook(self, product_ids):
+        if not product_ids:
+            return set()
+        restaurants_mask = -1
+        for product_id in product_ids:
+            restaurants_mask &= self.products.get(product_id, 0)
+            if not restaurants_mask:
+                return set()
+        return {
+            restaurant for position, restaurant in enumerate(self.restaurants)
+            if restaurants_mask >> position & 1
+        }
+
+    def is_located(self, restaurant):
+        return restaurant.id in self.locations.coords
+
+    def nearest_restaurants(self, latitude, longitude, k, restaurants):
+        """Return up to k [(distance_km, restaurant)] of the given restaurants, nearest first."""
+        candidates = {restaurant.id for restaurant in restaurants}
+        return [
+            (distance, self.restaurants_by_id[restaurant_id])
+            for distance, restaurant_id in self.locations.nearest(latitude, longitude, k, candidates)
+        ]
+
+    def restaurants_within(self, latitude, longitude, radius_km):
+        """Return [(distance_km, restaurant)] not further than radius_km, nearest first."""
+        return [
+            (distance, self.restaurants_by_id[restaurant_id])
+            for distance, restaurant_id in self.locations.within(latitude, longitude, radius_km)
+        ]
+
+
+_lock = threading.Lock()
+_index = None
+_version = 0
+
+
+def build_menu_index():
+    global _index, _version
+
+    catalog_version = get_catalog_version()
+    restaurants = list(Restaurant.objects.order_by('pk'))
+    menu_items = RestaurantMenuItem.objects \
+        .filter(availability=True) \
+        .values_list('restaurant_id', 'product_id')
+
+    restaurants_by_key = {}
+    for restaurant in restaurants:
+        restaurants_by_key.setdefault(normalize_address(restaurant.address), []).append(restaurant)
+    locations = Location.objects \
+        .found() \
+        .filter(address_key__in=restaurants_by_key) \
+        .values_list('address_key', 'latitude', 'longitude')
+    restaurant_coords = {
+        restaurant.id: (latitude, longitude)
+        for address_key, latitude, longitude in locations
+        for restaurant in restaurants_by_key[address_key]
+    }
+
+    with _lock:
+        _version += 1
+        _index = MenuIndex(restaurants, menu_items, restaurant_coords, _version, catalog_version)
+        return _index
+
+
+def get_menu_index():
+    index = _index
+    if index is None \
+            or index.catalog_version != get_catalog_version() \
+            or time.monotonic() - index.built_at > settings.MENU_INDEX_MAX_AGE:
+        index = build_menu_index()
+    return index
+
+
+def invalidate_menu_index():
+    global _index
+    with _lock:
+        _index = None
+
+
+def patch_menu_index(restaurant_id, product_id, available, catalog_version):
+    global _index, _version
+    with _lock:
+        if _index is None:
+            return
+        if restaurant_id not in _index.positions:
+            _index = None
+            return
+        _version += 1
+        _index.set_availability(restaurant_id, product_id, available)
+        _index.version = _version
+        _index.catalog_version = catalog_version
+
+
+def reset_restaurant_locations(address_keys):
+    """Drop the index if any of the changed locations belongs to a restaurant."""
+    index = _index
+    if index is not None and index.address_keys.intersection(address_keys):
+        invalidate_menu_index()
@@ -0,0 +1,21 @@
+# Generated by Django 3.2 on 2026-10-18 13:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0055_order_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='restaurantmenuitem',
+            index=models.Index(fields=['product', 'availability'], name='foodcartapp_product_71ea38_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurantmenuitem',
+            index=models.Index(fields=['restaurant', 'availability'], name='foodcartapp_restaur_f18bef_idx'),
+        ),
+    ]
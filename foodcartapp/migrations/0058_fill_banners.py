@@ -0,0 +1,31 @@
+# Generated by Django 3.2 on 2026-10-18 13:17
+
+from django.db import migrations
+
+BANNERS = [
+    ('Burger', 'burger.jpg', 'Tasty Burger at your door step'),
+    ('Spices', 'food.jpg', 'All Cuisines'),
+    ('New York', 'tasty.jpg', 'Food is incomplete without a tasty dessert'),
+]
+
+
+def fill_banners(apps, schema_editor):
+    """Create the banners the site used to have hardcoded.
+
+    Only rows are created; the images are copied from assets to the media
+    storage by the copy_banner_images command.
+    """
+    Banner = apps.get_model('foodcartapp', 'Banner')
+    for order, (title, image, text) in enumerate(BANNERS):
+        Banner.objects.create(title=title, image=f'banners/{image}', text=text, order=order)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0057_banner'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_banners, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2 on 2026-10-18 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0058_fill_banners'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True, verbose_name='ключ')),
+                ('request_hash', models.CharField(max_length=64, verbose_name='хэш запроса')),
+                ('response_status', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='код ответа')),
+                ('response_body', models.JSONField(blank=True, null=True, verbose_name='ответ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Создан')),
+            ],
+            options={
+                'verbose_name': 'ключ идемпотентности',
+                'verbose_name_plural': 'ключи идемпотентности',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2 on 2026-10-18 13:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0059_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingOrder',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tracking_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='номер для отслеживания')),
+                ('payload', models.JSONField(verbose_name='данные заказа')),
+                ('received_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Получен')),
+                ('processed_at', models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Обработан')),
+                ('error', models.TextField(blank=True, verbose_name='ошибка')),
+                ('order', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pending_order', to='foodcartapp.order', verbose_name='заказ')),
+            ],
+            options={
+                'verbose_name': 'заказ в очереди',
+                'verbose_name_plural': 'заказы в очереди',
+            },
+        ),
+    ]
@@ -1,13 +1,15 @@
+import uuid
+from datetime import timedelta
+
 from phonenumber_field.modelfields import PhoneNumberField
 
+from django.conf import settings
 from django.core.validators import MinValueValidator
 
 from django.db import models
-from django.db.models import F, Q, Sum, Subquery, OuterRef
+from django.db.models import F, Q, Sum
 from django.utils import timezone
 
-from location.models import Location
-
 
 class Restaurant(models.Model):
     name = models.CharField(
@@ -33,12 +35,9 @@ class Restaurant(models.Model):
 
 class ProductQuerySet(models.QuerySet):
     def available(self):
-        products = (
-            RestaurantMenuItem.objects
-                .filter(availability=True)
-                .values_list('product')
-        )
-        return self.filter(pk__in=products)
+        from .menu_index import get_menu_index
+
+        return self.filter(pk__in=get_menu_index().available_product_ids())
 
 
 class ProductCategory(models.Model):
@@ -97,6 +96,49 @@ class Product(models.Model):
         return self.name
 
 
+class Banner(models.Model):
+    title = models.CharField(
+        'заголовок',
+        max_length=50,
+    )
+    image = models.ImageField(
+        'картинка',
+        upload_to='banners/',
+    )
+    text = models.CharField(
+        'текст',
+        max_length=200,
+        blank=True,
+    )
+    order = models.PositiveIntegerField(
+        'порядок',
+        default=0,
+        db_index=True,
+    )
+    active_from = models.DateTimeField(
+        'показывать с',
+        null=True,
+        blank=True,
+    )
+    active_until = models.DateTimeField(
+        'показывать до',
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        ordering = ['order', 'pk']
+        verbose_name = 'баннер'
+        verbose_name_plural = 'баннеры'
+
+    def __str__(self):
+        return self.title
+
+    def is_active(self, moment):
+        return (self.active_from is None or self.active_from <= moment) \
+            and (self.active_until is None or moment < self.active_until)
+
+
 class RestaurantMenuItem(models.Model):
     restaurant = models.ForeignKey(
         Restaurant,
@@ -122,6 +164,10 @@ class RestaurantMenuItem(models.Model):
         unique_together = [
             ['restaurant', 'product']
         ]
+        indexes = [
+            models.Index(fields=['product', 'availability']),
+            models.Index(fields=['restaurant', 'availability']),
+        ]
 
     def __str__(self):
         return f"{self.restaurant.name} - {self.product.name}"
@@ -141,32 +187,34 @@ class OrderQuerySet(models.QuerySet):
     def for_managers(self):
         return self.annotate_order_cost().not_finished().restaurant_not_picked()
 
-    def fetch_restaurants_can_cook_order(self):
-        all_ordered_products = OrderProduct.objects \
-            .filter(order__status='NEW') \
-            .values('order_id', 'product')
+    def update(self, **kwargs):
+        # auto_now is only applied by save(), the manager feed needs
+        # updated_at bumped by bulk changes as well
+        kwargs.setdefault('updated_at', timezone.now())
+        return super().update(**kwargs)
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        updated_at = timezone.now()
+        for obj in objs:
+            obj.updated_at = updated_at
+        return super().bulk_update(objs, {*fields, 'updated_at'}, batch_size=batch_size)
 
-        rest_locations = Location.objects.filter(address=OuterRef('restaurant__address'))
-        all_restaurants_menu = RestaurantMenuItem.objects \
-            .filter(availability=True) \
-            .annotate(longitude=Subquery(rest_locations.values('longitude')),
-                      latitude=Subquery(rest_locations.values('latitude'))) \
-            .select_related('product') \
-            .select_related('restaurant')
+    def fetch_restaurants_can_cook_order(self, menu_index=None):
+        from .menu_index import get_menu_index
 
         orders = self
+        ordered_products = OrderProduct.objects \
+            .filter(order__in=[order.id for order in orders]) \
+            .values_list('order_id', 'product_id')
+        products_in_orders = {}
+        for order_id, product_id in ordered_products:
+            products_in_orders.setdefault(order_id, set()).add(product_id)
+
+        menu_index = menu_index or get_menu_index()
         for order in orders:
-            products_in_order = [p for p in all_ordered_products if p['order_id'] == order.id]
-            restaurants_can_cook_order = []
-            for product in products_in_order:
-                restaurants_can_cook_product = set()
-                for item in all_restaurants_menu:
-                    if item.product_id == product['product']:
-                        item.restaurant.longitude = item.longitude
-                        item.restaurant.latitude = item.latitude
-                        restaurants_can_cook_product.add(item.restaurant)
-                restaurants_can_cook_order.append(restaurants_can_cook_product)
-            order.restaurants_can_cook_order = set.intersection(*restaurants_can_cook_order)
+            order.restaurants_can_cook_order = menu_index.restaurants_can_cook(
+                products_in_orders.get(order.id, set())
+            )
         return orders
 
 
@@ -238,6 +286,11 @@ class Order(models.Model):
         null=True,
         db_index=True,
     )
+    updated_at = models.DateTimeField(
+        'Изменён',
+        auto_now=True,
+        db_index=True,
+    )
     payment_method = models.CharField(
         'Способ оплаты',
         max_length=200,
@@ -296,3 +349,89 @@ class OrderProduct(models.Model):
 
     def __str__(self):
         return f'#{self.order.pk} order: {self.product} × {self.quantity}'
+
+
+class PendingOrder(models.Model):
+    tracking_id = models.UUIDField(
+        'номер для отслеживания',
+        default=uuid.uuid4,
+        unique=True,
+        editable=False,
+    )
+    payload = models.JSONField('данные заказа')
+    received_at = models.DateTimeField(
+        'Получен',
+        auto_now_add=True,
+        db_index=True,
+    )
+    processed_at = models.DateTimeField(
+        'Обработан',
+        null=True,
+        blank=True,
+        db_index=True,
+    )
+    order = models.OneToOneField(
+        Order,
+        verbose_name='заказ',
+        related_name='pending_order',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    error = models.TextField(
+        'ошибка',
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = 'заказ в очереди'
+        verbose_name_plural = 'заказы в очереди'
+
+    def __str__(self):
+        return str(self.tracking_id)
+
+
+class IdempotencyKeyQuerySet(models.QuerySet):
+    def expired(self):
+        """Keys older than IDEMPOTENCY_KEY_TTL, a retry with them creates a new order."""
+        ttl = timedelta(hours=settings.IDEMPOTENCY_KEY_TTL)
+        return self.filter(created_at__lt=timezone.now() - ttl)
+
+
+class IdempotencyKey(models.Model):
+    key = models.CharField(
+        'ключ',
+        max_length=255,
+        unique=True,
+    )
+    request_hash = models.CharField(
+        'хэш запроса',
+        max_length=64,
+    )
+    response_status = models.PositiveSmallIntegerField(
+        'код ответа',
+        null=True,
+        blank=True,
+    )
+    response_body = models.JSONField(
+        'ответ',
+        null=True,
+        blank=True,
+    )
+    created_at = models.DateTimeField(
+        'Создан',
+        auto_now_add=True,
+        db_index=True,
+    )
+
+    objects = IdempotencyKeyQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'ключ идемпотентности'
+        verbose_name_plural = 'ключи идемпотентности'
+
+    def __str__(self):
+        return self.key
+
+    def is_expired(self):
+        return self.created_at < timezone.now() - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL)
@@ -0,0 +1,134 @@
+import io
+import json
+
+from rest_framework.exceptions import ValidationError
+
+from django.db import connection, transaction
+
+from location.geocoding import enqueue_addresses_on_commit
+
+from .models import Order, OrderProduct
+from .views import OrderSerializer
+
+
+def read_orders(lines, products_by_id):
+    """Parse and validate JSONL orders one line at a time.
+
+    Yields (line_number, validated_data, errors). Every line goes through
+    the same OrderSerializer, built once, against the products loaded
+    beforehand, so validation does not query the database.
+    """
+    serializer = OrderSerializer(context={'products_by_id': products_by_id})
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            validated_data = serializer.run_validation(json.loads(line))
+        except ValueError as error:
+            yield line_number, None, {'json': [str(error)]}
+        except ValidationError as error:
+            yield line_number, None, error.detail
+        else:
+            yield line_number, validated_data, None
+
+
+def save_orders(validated_orders):
+    """Insert a batch of orders and their lines in one transaction.
+
+    Order ids are reserved up front, so lines can reference their orders
+    without reading inserted rows back. PostgreSQL gets the rows with COPY,
+    other databases with bulk_create. Returns (orders, lines) inserted.
+    """
+    with transaction.atomic():
+        order_ids = reserve_ids(Order, len(validated_orders))
+        orders = []
+        order_products = []
+        for order_id, validated_data in zip(order_ids, validated_orders):
+            orders.append(Order(
+                id=order_id,
+                firstname=validated_data['firstname'],
+                lastname=validated_data['lastname'],
+                phonenumber=validated_data['phonenumber'],
+                address=validated_data['address'],
+            ))
+            for ordered_product in validated_data['products']:
+                order_products.append(OrderProduct(
+                    order_id=order_id,
+                    product=ordered_product['product'],
+                    fixed_price=ordered_product['product'].price,
+                    quantity=ordered_product['quantity'],
+                ))
+
+        insert_objects(Order, orders)
+        insert_objects(OrderProduct, order_products)
+
+        addresses = {order.address for order in orders}
+        enqueue_addresses_on_commit(addresses)
+    return len(orders), len(order_products)
+
+
+def reserve_ids(model, count):
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+                [table, model._meta.pk.column, count],
+            )
+            return [order_id for order_id, in cursor.fetchall()]
+        cursor.execute(
+            f'SELECT COALESCE(MAX({connection.ops.quote_name(model._meta.pk.column)}), 0) '
+            f'FROM {connection.ops.quote_name(table)}'
+        )
+        last_id, = cursor.fetchone()
+        if connection.vendor == 'sqlite':
+            # AUTOINCREMENT never reuses ids of deleted rows, neither should we
+            cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s', [table])
+            last_id = max([last_id, *(seq for seq, in cursor.fetchall())])
+    return list(range(last_id + 1, last_id + count + 1))
+
+
+def insert_objects(model, objects):
+    """Insert model instances with COPY on PostgreSQL and bulk_create elsewhere."""
+    if connection.vendor == 'postgresql':
+        copy_objects(model, objects)
+    else:
+        model.objects.bulk_create(objects)
+
+
+def insert_fields(model, objects):
+    """Concrete fields to write, without the primary key if the database assigns it."""
+    fields = model._meta.concrete_fields
+    if objects and objects[0].pk is None:
+        fields = [field for field in fields if not field.primary_key]
+    return fields
+
+
+def copy_objects(model, objects):
+    """Write model instances to the table with COPY FROM STDIN in text format."""
+    fields = insert_fields(model, objects)
+    buffer = io.StringIO()
+    for obj in objects:
+        values = [field.get_db_prep_save(field.pre_save(obj, add=True), connection) for field in fields]
+        buffer.write('\t'.join(format_copy_value(value) for value in values))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN',
+            buffer,
+        )
+
+
+def format_copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value) \
+        .replace('\\', '\\\\') \
+        .replace('\t', '\\t') \
+        .replace('\n', '\\n') \
+        .replace('\r', '\\r')
@@ -0,0 +1,89 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from location.geocoding import enqueue_addresses_on_commit
+
+from .models import Order, OrderProduct, PendingOrder, Product
+
+
+def spool_order(validated_data):
+    """Save a validated order to the queue instead of creating it."""
+    return PendingOrder.objects.create(payload={
+        'firstname': validated_data['firstname'],
+        'lastname': validated_data['lastname'],
+        'phonenumber': str(validated_data['phonenumber']),
+        'address': validated_data['address'],
+        'products': [
+            {'product': product['product'].id, 'quantity': product['quantity']}
+            for product in validated_data['products']
+        ],
+    })
+
+
+def create_pending_orders(batch_size):
+    """Create orders for the oldest queued payloads in one transaction.
+
+    Products of the whole batch are loaded with one query and order lines
+    are saved with one bulk_create. Orders themselves are bulk created
+    where the database returns new ids from a bulk insert (PostgreSQL),
+    one by one otherwise. Several workers may drain the queue at once,
+    rows locked by one of them are skipped by the others.
+    Returns (processed, created).
+    """
+    with transaction.atomic():
+        pending_orders = list(
+            PendingOrder.objects
+                .select_for_update(skip_locked=True)
+                .filter(processed_at__isnull=True)
+                .order_by('received_at')[:batch_size]
+        )
+        products_by_id = Product.objects.in_bulk({
+            line['product']
+            for pending_order in pending_orders
+            for line in pending_order.payload['products']
+        })
+
+        orders = {}
+        for pending_order in pending_orders:
+            payload = pending_order.payload
+            unknown = [
+                str(line['product']) for line in payload['products']
+                if line['product'] not in products_by_id
+            ]
+            if unknown:
+                pending_order.error = f'Нет таких товаров: {", ".join(unknown)}'
+                continue
+            orders[pending_order.pk] = Order(
+                firstname=payload['firstname'],
+                lastname=payload['lastname'],
+                phonenumber=payload['phonenumber'],
+                address=payload['address'],
+            )
+
+        if connection.features.can_return_rows_from_bulk_insert:
+            Order.objects.bulk_create(orders.values())
+        else:
+            for order in orders.values():
+                order.save()
+
+        order_products = []
+        processed_at = timezone.now()
+        for pending_order in pending_orders:
+            pending_order.processed_at = processed_at
+            if pending_order.pk not in orders:
+                continue
+            pending_order.order = orders[pending_order.pk]
+            for line in pending_order.payload['products']:
+                product = products_by_id[line['product']]
+                order_products.append(OrderProduct(
+                    order=pending_order.order,
+                    product=product,
+                    fixed_price=product.price,
+                    quantity=line['quantity'],
+                ))
+        OrderProduct.objects.bulk_create(order_products)
+        PendingOrder.objects.bulk_update(pending_orders, ['order', 'error', 'processed_at'])
+
+        addresses = [order.address for order in orders.values()]
+        enqueue_addresses_on_commit(addresses)
+    return len(pending_orders), len(orders)
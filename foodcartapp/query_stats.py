@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+UNRESOLVED_VIEW = 'unresolved'
+SQL_LOG_LIMIT = 1000
+
+
+class QueryCollector:
+    """Execute wrapper counting the queries of one request and their time.
+
+    Only the SQL text of the slowest statement is kept, without parameters,
+    so personal data from orders does not end up in logs.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            self.count += 1
+            self.total_time += elapsed
+            if elapsed >= self.slowest_time:
+                self.slowest_time = elapsed
+                self.slowest_sql = sql
+
+
+_lock = threading.Lock()
+_stats = {}
+
+
+def record_query_stats(view_name, collector, check_budget=True):
+    """Add the request to the per-view aggregate and log it.
+
+    Requests making more queries than QUERY_BUDGET are logged as warnings,
+    which is how N+1 queries show up. QUERY_BUDGET = 0 turns the check off.
+    """
+    over_budget = check_budget and 0 < settings.QUERY_BUDGET < collector.count
+    with _lock:
+        view_stats = _stats.setdefault(view_name, {
+            'requests': 0,
+            'queries': 0,
+            'sql_time': 0.0,
+            'max_queries': 0,
+            'over_budget': 0,
+            'slowest_time': 0.0,
+            'slowest_sql': None,
+        })
+        view_stats['requests'] += 1
+        view_stats['queries'] += collector.count
+        view_stats['sql_time'] += collector.total_time
+        view_stats['max_queries'] = max(view_stats['max_queries'], collector.count)
+        view_stats['over_budget'] += over_budget
+        if collector.slowest_time >= view_stats['slowest_time']:
+            view_stats['slowest_time'] = collector.slowest_time
+            view_stats['slowest_sql'] = collector.slowest_sql
+
+    extra = {
+        'view_name': view_name,
+        'queries': collector.count,
+        'sql_time_ms': round(collector.total_time * 1000, 3),
+        'slowest_ms': round(collector.slowest_time * 1000, 3),
+        'slowest_sql': collector.slowest_sql and collector.slowest_sql[:SQL_LOG_LIMIT],
+        'over_budget': over_budget,
+    }
+    if over_budget:
+        logger.warning(
+            '%s: %s запросов к БД при бюджете %s, самый долгий за %.1f мс: %s',
+            view_name, collector.count, settings.QUERY_BUDGET, extra['slowest_ms'], extra['slowest_sql'],
+            extra=extra,
+        )
+    else:
+        logger.info(
+            '%s: %s запросов к БД за %.1f мс',
+            view_name, collector.count, extra['sql_time_ms'],
+            extra=extra,
+        )
+
+
+def get_query_stats():
+    """Return {view_name: stats} collected by this process, the busiest views first."""
+    with _lock:
+        stats = {view_name: dict(view_stats) for view_name, view_stats in _stats.items()}
+    for view_stats in stats.values():
+        view_stats['avg_queries'] = view_stats['queries'] / view_stats['requests']
+        view_stats['avg_sql_time'] = view_stats['sql_time'] / view_stats['requests']
+    return dict(sorted(stats.items(), key=lambda item: item[1]['sql_time'], reverse=True))
+
+
+def reset_query_stats():
+    with _lock:
+        _stats.clear()
+
+
+class QueryStatsMiddleware:
+    """Record query count, SQL time and the slowest statement of every request.
+
+    Stats are keyed by URL name, e.g. `restaurateur:view_orders`. Streaming
+    responses are recorded when the stream ends; their queries grow with
+    the stream length by design, so QUERY_BUDGET does not apply to them.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        collector = QueryCollector()
+        with connection.execute_wrapper(collector):
+            response = self.get_response(request)
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        view_name = resolver_match.view_name if resolver_match else UNRESOLVED_VIEW
+        if response.streaming:
+            response.streaming_content = self.stream(response.streaming_content, view_name, collector)
+        else:
+            record_query_stats(view_name, collector)
+        return response
+
+    @staticmethod
+    def stream(content, view_name, collector):
+        try:
+            with connection.execute_wrapper(collector):
+                yield from content
+        finally:
+            record_query_stats(view_name, collector, check_budget=False)
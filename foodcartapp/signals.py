@@ -0,0 +1,80 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from location.models import Location
+from location.signals import locations_fetched
+
+from .banners import invalidate_banners
+from .catalog import bump_catalog_version
+from .menu_index import invalidate_menu_index, patch_menu_index, reset_restaurant_locations
+from .models import Banner, Product, ProductCategory, Restaurant, RestaurantMenuItem
+
+
+@receiver(pre_save, sender=RestaurantMenuItem)
+def remember_menu_item_pair(sender, instance, raw=False, **kwargs):
+    instance.previous_pair = None
+    if instance.pk and not raw:
+        instance.previous_pair = RestaurantMenuItem.objects \
+            .filter(pk=instance.pk) \
+            .values_list('restaurant_id', 'product_id') \
+            .first()
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+def patch_menu_item_availability(sender, instance, **kwargs):
+    previous_pair = getattr(instance, 'previous_pair', None)
+    current_pair = (instance.restaurant_id, instance.product_id)
+    availability = instance.availability
+
+    def patch():
+        catalog_version = bump_catalog_version()
+        # An edited menu item may point at another restaurant or product,
+        # the old pair is not on sale anymore
+        if previous_pair and previous_pair != current_pair:
+            patch_menu_index(*previous_pair, False, catalog_version=catalog_version)
+        patch_menu_index(*current_pair, availability, catalog_version=catalog_version)
+
+    transaction.on_commit(patch)
+
+
+@receiver(post_delete, sender=RestaurantMenuItem)
+def patch_deleted_menu_item(sender, instance, **kwargs):
+    transaction.on_commit(lambda: patch_menu_index(
+        instance.restaurant_id,
+        instance.product_id,
+        False,
+        catalog_version=bump_catalog_version(),
+    ))
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def reset_menu_index(sender, **kwargs):
+    transaction.on_commit(invalidate_menu_index)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+def reset_catalog(sender, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def reset_banners(sender, **kwargs):
+    transaction.on_commit(invalidate_banners)
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def reset_saved_restaurant_location(sender, instance, **kwargs):
+    transaction.on_commit(lambda: reset_restaurant_locations({instance.address_key}))
+
+
+@receiver(locations_fetched)
+def reset_fetched_restaurant_locations(sender, locations, **kwargs):
+    address_keys = {location.address_key for location in locations}
+    transaction.on_commit(lambda: reset_restaurant_locations(address_keys))
@@ -0,0 +1,157 @@
+"""Deterministic synthetic data for benchmarks and scale testing."""
+import hashlib
+import math
+import random
+from decimal import Decimal
+
+from django.db import reset_queries, transaction
+
+from location.models import Location
+from location.normalization import normalize_address
+
+from .models import (Order, OrderProduct, Product, ProductCategory, Restaurant,
+                     RestaurantMenuItem)
+from .order_loader import insert_objects, reserve_ids
+
+MOSCOW_CENTER = (55.751, 37.618)
+
+STREETS = [
+    'Тверская', 'Арбат', 'Мясницкая', 'Покровка', 'Большая Якиманка', 'Новослободская',
+    'Профсоюзная', 'Ленинский проспект', 'Ленинградский проспект', 'Варшавское шоссе',
+    'Каширское шоссе', 'Дмитровское шоссе', 'проспект Мира', 'Щёлковское шоссе',
+    'Садовая-Кудринская', 'Маросейка', 'Пятницкая', 'Остоженка', 'Сретенка', 'Большая Ордынка',
+]
+FIRSTNAMES = ['Иван', 'Мария', 'Алексей', 'Анна', 'Дмитрий', 'Елена', 'Сергей', 'Ольга', 'Павел', 'Наталья']
+LASTNAMES = ['Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров', 'Соколов', 'Михайлов']
+CATEGORIES = ['Бургеры', 'Напитки', 'Десерты', 'Закуски', 'Салаты', 'Соусы', 'Комбо', 'Детское меню']
+
+
+def random_address(randomizer):
+    return f'Москва, {randomizer.choice(STREETS)}, {randomizer.randint(1, 250)}'
+
+
+def random_point(randomizer, radius_km=20):
+    """Uniformly random point within radius_km of the center of Moscow."""
+    distance = radius_km * math.sqrt(randomizer.random())
+    bearing = randomizer.uniform(0, 2 * math.pi)
+    latitude = MOSCOW_CENTER[0] + distance * math.cos(bearing) / 111.32
+    longitude = MOSCOW_CENTER[1] \
+        + distance * math.sin(bearing) / (111.32 * math.cos(math.radians(MOSCOW_CENTER[0])))
+    return latitude, longitude
+
+
+def fake_fetch_coordinates(apikey, address):
+    """Offline stand-in for the Yandex geocoder: the same address always gets the same point."""
+    seed = int.from_bytes(hashlib.sha256(address.encode()).digest()[:8], 'big')
+    latitude, longitude = random_point(random.Random(seed))
+    return f'{latitude:.6f}', f'{longitude:.6f}'
+
+
+def address_pool(count):
+    """`count` distinct Moscow addresses, always the same for the same count."""
+    houses = 250
+    return [
+        f'Москва, {STREETS[number % len(STREETS)]}, {number // len(STREETS) % houses + 1}'
+        + (f', кв. {number // (len(STREETS) * houses)}' if number >= len(STREETS) * houses else '')
+        for number in range(count)
+    ]
+
+
+def create_locations(addresses, batch_size=1000):
+    """Save Location rows for addresses with coordinates from fake_fetch_coordinates."""
+    for batch_start in range(0, len(addresses), batch_size):
+        locations = []
+        for address in addresses[batch_start:batch_start + batch_size]:
+            latitude, longitude = fake_fetch_coordinates(None, address)
+            locations.append(Location(
+                address=address,
+                address_key=normalize_address(address),
+                latitude=Decimal(latitude),
+                longitude=Decimal(longitude),
+            ))
+        Location.objects.bulk_create(locations, ignore_conflicts=True)
+
+
+def create_catalog(randomizer, restaurants, products, menu_share=0.7, batch_size=1000):
+    """Create categories, products, restaurants with locations and their menus.
+
+    Returns (restaurant ids, [(product_id, price)] of the created products).
+    """
+    categories = [
+        ProductCategory(id=category_id, name=name)
+        for category_id, name in zip(reserve_ids(ProductCategory, len(CATEGORIES)), CATEGORIES)
+    ]
+    insert_objects(ProductCategory, categories)
+
+    product_objects = [
+        Product(
+            id=product_id,
+            name=f'Товар №{number}',
+            category=randomizer.choice(categories),
+            price=Decimal(randomizer.randrange(9900, 99900, 100)) / 100,
+            image='burger.jpg',
+            special_status=randomizer.random() < 0.1,
+            description='',
+        )
+        for number, product_id in enumerate(reserve_ids(Product, products), start=1)
+    ]
+    insert_objects(Product, product_objects)
+
+    restaurant_objects = [
+        Restaurant(
+            id=restaurant_id,
+            name=f'Star Burger {number}',
+            address=f'{random_address(randomizer)}, ресторан {number}',
+            contact_phone=f'+7495{randomizer.randrange(10 ** 7):07d}',
+        )
+        for number, restaurant_id in enumerate(reserve_ids(Restaurant, restaurants), start=1)
+    ]
+    insert_objects(Restaurant, restaurant_objects)
+    create_locations([restaurant.address for restaurant in restaurant_objects], batch_size)
+
+    for restaurant in restaurant_objects:
+        insert_objects(RestaurantMenuItem, [
+            RestaurantMenuItem(restaurant_id=restaurant.id, product_id=product.id)
+            for product in product_objects if randomizer.random() < menu_share
+        ])
+    restaurant_ids = [restaurant.id for restaurant in restaurant_objects]
+    return restaurant_ids, [(product.id, product.price) for product in product_objects]
+
+
+def create_orders(randomizer, count, lines, product_prices, addresses, batch_size=5000, build_order=None):
+    """Create `count` orders of `lines` lines each, batch by batch.
+
+    Every batch is saved in its own transaction and dropped before the
+    next one is built, so memory does not grow with `count`. `build_order`
+    may set extra fields (status, dates, restaurant) on each new Order.
+    Returns the number of order lines created.
+    """
+    lines_created = 0
+    for batch_start in range(0, count, batch_size):
+        batch_count = min(batch_size, count - batch_start)
+        with transaction.atomic():
+            orders = []
+            order_products = []
+            for order_id in reserve_ids(Order, batch_count):
+                order = Order(
+                    id=order_id,
+                    firstname=randomizer.choice(FIRSTNAMES),
+                    lastname=randomizer.choice(LASTNAMES),
+                    phonenumber=f'+7900{randomizer.randrange(10 ** 7):07d}',
+                    address=randomizer.choice(addresses),
+                )
+                if build_order:
+                    build_order(randomizer, order)
+                orders.append(order)
+                for product_id, price in randomizer.sample(product_prices, min(lines, len(product_prices))):
+                    order_products.append(OrderProduct(
+                        order_id=order_id,
+                        product_id=product_id,
+                        fixed_price=price,
+                        quantity=randomizer.randint(1, 3),
+                    ))
+            insert_objects(Order, orders)
+            insert_objects(OrderProduct, order_products)
+        lines_created += len(order_products)
+        reset_queries()
+    return lines_created
@@ -0,0 +1,633 @@
+import json
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .management.commands.load_test_orders import Command as LoadTestOrdersCommand
+from .menu_index import get_menu_index, invalidate_menu_index
+from .order_spool import create_pending_orders
+from .query_stats import get_query_stats, reset_query_stats
+from .idempotency import delete_expired_idempotency_keys
+from .models import (
+    Banner, IdempotencyKey, Order, OrderProduct, PendingOrder, Product, ProductCategory, Restaurant,
+    RestaurantMenuItem,
+)
+
+
+class CatalogTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_menu_index()
+        self.category = ProductCategory.objects.create(name='Бургеры')
+        self.restaurant = Restaurant.objects.create(name='Star Burger', address='Москва, Тверская 1')
+        self.burger = Product.objects.create(
+            name='Чизбургер',
+            category=self.category,
+            price=199,
+            image='burger.jpg',
+            description='',
+        )
+        RestaurantMenuItem.objects.create(restaurant=self.restaurant, product=self.burger)
+
+    def save_and_commit(self, obj):
+        with self.captureOnCommitCallbacks(execute=True):
+            obj.save()
+
+
+class RestaurantsCanCookOrderTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fries = Product.objects.create(name='Картофель фри', price=99, image='fries.jpg', description='')
+        self.cola = Product.objects.create(name='Кола', price=79, image='cola.jpg', description='')
+        self.other_restaurant = Restaurant.objects.create(name='Star Burger Арбат', address='Москва, Арбат 1')
+        RestaurantMenuItem.objects.create(restaurant=self.restaurant, product=self.fries)
+        RestaurantMenuItem.objects.create(restaurant=self.other_restaurant, product=self.burger)
+        RestaurantMenuItem.objects.create(restaurant=self.other_restaurant, product=self.fries, availability=False)
+        RestaurantMenuItem.objects.create(restaurant=self.other_restaurant, product=self.cola)
+
+    def create_order(self, products):
+        order = Order.objects.create(
+            firstname='Иван', lastname='Петров', phonenumber='+79001234567', address='Москва',
+        )
+        for product in products:
+            OrderProduct.objects.create(order=order, product=product, fixed_price=product.price, quantity=1)
+        return order
+
+    def test_restaurants_have_every_ordered_product(self):
+        orders = {
+            'burger': self.create_order([self.burger]),
+            'burger_and_fries': self.create_order([self.burger, self.fries]),
+            'fries_and_cola': self.create_order([self.fries, self.cola]),
+            'empty': self.create_order([]),
+        }
+
+        fetched_orders = {
+            order.id: order
+            for order in Order.objects.filter(pk__in=[order.id for order in orders.values()])
+                .fetch_restaurants_can_cook_order()
+        }
+
+        self.assertEqual(
+            {name: fetched_orders[order.id].restaurants_can_cook_order for name, order in orders.items()},
+            {
+                'burger': {self.restaurant, self.other_restaurant},
+                'burger_and_fries': {self.restaurant},
+                'fries_and_cola': set(),
+                'empty': set(),
+            },
+        )
+
+
+class MenuIndexTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fries = Product.objects.create(name='Картофель фри', price=99, image='fries.jpg', description='')
+        self.menu_item = RestaurantMenuItem.objects.get(restaurant=self.restaurant, product=self.burger)
+
+    def test_index_follows_menu(self):
+        menu_index = get_menu_index()
+
+        self.assertEqual(menu_index.restaurants_can_cook({self.burger.id}), {self.restaurant})
+        self.assertEqual(menu_index.restaurants_can_cook({self.burger.id, self.fries.id}), set())
+        self.assertEqual(menu_index.available_product_ids(), [self.burger.id])
+
+    def test_availability_change_patches_index(self):
+        menu_index = get_menu_index()
+        version = menu_index.version
+
+        self.menu_item.availability = False
+        self.save_and_commit(self.menu_item)
+
+        self.assertIs(get_menu_index(), menu_index)
+        self.assertGreater(menu_index.version, version)
+        self.assertFalse(menu_index.is_available(self.burger.id))
+
+    def test_moved_menu_item_clears_old_pair(self):
+        other_restaurant = Restaurant.objects.create(name='Star Burger Арбат', address='Москва, Арбат 1')
+        menu_index = get_menu_index()
+
+        self.menu_item.product = self.fries
+        self.save_and_commit(self.menu_item)
+        self.assertIs(get_menu_index(), menu_index)
+        self.assertFalse(menu_index.is_available(self.burger.id))
+        self.assertEqual(menu_index.restaurants_can_cook({self.fries.id}), {self.restaurant})
+
+        self.menu_item.restaurant = other_restaurant
+        self.save_and_commit(self.menu_item)
+        self.assertEqual(menu_index.restaurants_can_cook({self.fries.id}), {other_restaurant})
+
+    def test_deleted_menu_item_is_unavailable(self):
+        menu_index = get_menu_index()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.menu_item.delete()
+
+        self.assertFalse(menu_index.is_available(self.burger.id))
+
+    def test_new_restaurant_rebuilds_index(self):
+        menu_index = get_menu_index()
+
+        self.save_and_commit(Restaurant(name='Star Burger Арбат', address='Москва, Арбат 1'))
+
+        self.assertIsNot(get_menu_index(), menu_index)
+        self.assertEqual(len(get_menu_index().restaurants), 2)
+
+
+class ProductListApiTest(CatalogTestCase):
+    def test_warm_cache_does_not_touch_database(self):
+        self.client.get('/api/products/')
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([product['name'] for product in response.json()], ['Чизбургер'])
+
+    def test_compact_body_keeps_price_as_string(self):
+        response = self.client.get('/api/products/')
+
+        self.assertNotIn(b'\n', response.content)
+        self.assertIn('Чизбургер'.encode(), response.content)
+        self.assertEqual(response.json()[0]['price'], '199.00')
+
+    def test_not_modified(self):
+        etag = self.client.get('/api/products/')['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_catalog_change_refreshes_response(self):
+        etag = self.client.get('/api/products/')['ETag']
+
+        self.burger.name = 'Двойной чизбургер'
+        self.save_and_commit(self.burger)
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual([product['name'] for product in response.json()], ['Двойной чизбургер'])
+
+    def test_menu_change_refreshes_response(self):
+        self.client.get('/api/products/')
+
+        menu_item = RestaurantMenuItem.objects.get()
+        menu_item.availability = False
+        self.save_and_commit(menu_item)
+
+        self.assertEqual(self.client.get('/api/products/').json(), [])
+
+
+class ProductListFilterTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.drinks = ProductCategory.objects.create(name='Напитки')
+        self.other_restaurant = Restaurant.objects.create(name='Star Burger 2', address='Москва, Арбат 1')
+        self.cola = Product.objects.create(
+            name='Кола', category=self.drinks, price=99, image='cola.jpg', description='',
+        )
+        self.shake = Product.objects.create(
+            name='Шейк', category=self.drinks, price=149, image='shake.jpg', description='',
+            special_status=True,
+        )
+        RestaurantMenuItem.objects.create(restaurant=self.other_restaurant, product=self.cola)
+        RestaurantMenuItem.objects.create(restaurant=self.restaurant, product=self.shake)
+        RestaurantMenuItem.objects.create(
+            restaurant=self.other_restaurant, product=self.shake, availability=False,
+        )
+
+    def get_names(self, **params):
+        response = self.client.get('/api/products/', params)
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.json()]
+
+    def test_filters(self):
+        self.assertEqual(self.get_names(), ['Чизбургер', 'Кола', 'Шейк'])
+        self.assertEqual(self.get_names(category=self.drinks.id), ['Кола', 'Шейк'])
+        self.assertEqual(self.get_names(restaurant=self.other_restaurant.id), ['Кола'])
+        self.assertEqual(self.get_names(restaurant=self.restaurant.id), ['Чизбургер', 'Шейк'])
+        self.assertEqual(self.get_names(special_status='true'), ['Шейк'])
+        self.assertEqual(
+            self.get_names(category=self.drinks.id, special_status='false'),
+            ['Кола'],
+        )
+
+    def test_pages(self):
+        response = self.client.get('/api/products/', {'category': self.drinks.id, 'page_size': 1, 'page': 1})
+        self.assertEqual([product['name'] for product in response.json()], ['Кола'])
+        self.assertIn('page=2', response['Link'])
+
+        response = self.client.get('/api/products/', {'category': self.drinks.id, 'page_size': 1, 'page': 2})
+        self.assertEqual([product['name'] for product in response.json()], ['Шейк'])
+        self.assertNotIn('Link', response)
+
+    def test_filtered_responses_are_cached_separately(self):
+        self.get_names(category=self.drinks.id)
+        self.get_names(restaurant=self.restaurant.id)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_names(category=self.drinks.id), ['Кола', 'Шейк'])
+            self.assertEqual(self.get_names(restaurant=self.restaurant.id), ['Чизбургер', 'Шейк'])
+
+    def test_invalid_filter(self):
+        response = self.client.get('/api/products/', {'page': 0})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('page', response.json())
+
+
+class BannersApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        Banner.objects.all().delete()
+        self.now = timezone.now()
+        Banner.objects.create(title='Бургер', image='banners/burger.jpg', order=2)
+        Banner.objects.create(
+            title='Завтраки',
+            image='banners/food.jpg',
+            order=1,
+            active_from=self.now + timedelta(hours=1),
+            active_until=self.now + timedelta(hours=2),
+        )
+
+    def get_titles(self, moment):
+        with mock.patch('django.utils.timezone.now', return_value=moment):
+            response = self.client.get('/api/banners/')
+        return [banner['title'] for banner in response.json()]
+
+    def test_activation_window_without_queries(self):
+        self.get_titles(self.now)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_titles(self.now), ['Бургер'])
+            self.assertEqual(
+                self.get_titles(self.now + timedelta(minutes=90)),
+                ['Завтраки', 'Бургер'],
+            )
+            self.assertEqual(self.get_titles(self.now + timedelta(hours=3)), ['Бургер'])
+
+    def test_cache_headers(self):
+        with mock.patch('django.utils.timezone.now', return_value=self.now):
+            response = self.client.get('/api/banners/')
+            not_modified = self.client.get('/api/banners/', HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_banner_change_rebuilds_payload(self):
+        self.client.get('/api/banners/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Banner.objects.create(title='Напитки', image='banners/tasty.jpg', order=3)
+
+        self.assertEqual(
+            [banner['title'] for banner in self.client.get('/api/banners/').json()],
+            ['Бургер', 'Напитки'],
+        )
+
+
+class CopyBannerImagesTest(TestCase):
+    def test_copies_missing_images(self):
+        with tempfile.TemporaryDirectory() as media_root, self.settings(MEDIA_ROOT=media_root):
+            call_command('copy_banner_images', stdout=StringIO())
+            second_run = StringIO()
+            call_command('copy_banner_images', stdout=second_run)
+
+            for banner in Banner.objects.all():
+                self.assertTrue(default_storage.exists(banner.image.name), banner.image.name)
+        self.assertEqual(Banner.objects.count(), 3)
+        self.assertIn('Скопировано картинок: 0', second_run.getvalue())
+
+
+class OrderTestCase(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = [self.burger]
+        for number in range(14):
+            product = Product.objects.create(
+                name=f'Бургер {number}', price=100 + number, image='burger.jpg', description='',
+            )
+            RestaurantMenuItem.objects.create(restaurant=self.restaurant, product=product)
+            self.products.append(product)
+
+    def post_order(self, products, **headers):
+        return self.client.post('/api/order/', {
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79001234567',
+            'address': 'Москва, Тверская 2',
+            'products': [{'product': product.id, 'quantity': 2} for product in products],
+        }, content_type='application/json', **headers)
+
+
+class RegisterOrderTest(OrderTestCase):
+    def test_query_count_does_not_depend_on_cart_size(self):
+        self.post_order(self.products[:1])
+
+        with self.assertNumQueries(5):
+            response = self.post_order(self.products[:1])
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(5):
+            response = self.post_order(self.products)
+        self.assertEqual(response.status_code, 200)
+
+        order = Order.objects.latest('pk')
+        self.assertEqual(order.ordered_items.count(), 15)
+        self.assertEqual(order.ordered_items.get(product=self.burger).fixed_price, self.burger.price)
+
+    def test_unknown_product(self):
+        response = self.post_order([self.burger, Product(id=999)])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('999', response.json()['products'][0])
+        self.assertFalse(Order.objects.exists())
+
+    def test_failed_enqueue_keeps_order(self):
+        enqueue_addresses = mock.patch(
+            'location.geocoding.enqueue_addresses',
+            side_effect=OperationalError('database is locked'),
+        )
+        with enqueue_addresses, self.assertLogs('location.geocoding', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.post_order([self.burger])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Order.objects.exists())
+
+
+class IdempotencyKeyTest(OrderTestCase):
+    def test_replay_returns_first_response(self):
+        first = self.post_order(self.products[:2], HTTP_IDEMPOTENCY_KEY='order-1')
+
+        with CaptureQueriesContext(connection) as queries:
+            replay = self.post_order(self.products[:2], HTTP_IDEMPOTENCY_KEY='order-1')
+
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(len(queries), 1)
+        self.assertFalse([query for query in queries if 'foodcartapp_order' in query['sql']])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_replay_after_product_went_off_sale(self):
+        ordered_products = [Product(id=product.id) for product in self.products[:2]]
+        first = self.post_order(ordered_products, HTTP_IDEMPOTENCY_KEY='order-1')
+        menu_item = RestaurantMenuItem.objects.get(product=self.products[1])
+        menu_item.availability = False
+        self.save_and_commit(menu_item)
+        self.products[0].delete()
+
+        replay = self.post_order(ordered_products, HTTP_IDEMPOTENCY_KEY='order-1')
+
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+
+    def test_key_reused_for_other_order(self):
+        self.post_order(self.products[:2], HTTP_IDEMPOTENCY_KEY='order-1')
+
+        response = self.post_order(self.products[:3], HTTP_IDEMPOTENCY_KEY='order-1')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_order_does_not_keep_key(self):
+        self.post_order([Product(id=999)], HTTP_IDEMPOTENCY_KEY='order-1')
+
+        response = self.post_order(self.products[:1], HTTP_IDEMPOTENCY_KEY='order-1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_expired_keys(self):
+        self.post_order(self.products[:1], HTTP_IDEMPOTENCY_KEY='order-1')
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+
+        self.assertFalse(self.post_order(self.products[:1], HTTP_IDEMPOTENCY_KEY='order-1').has_header(
+            'Idempotent-Replayed'
+        ))
+        self.assertEqual(Order.objects.count(), 2)
+
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(delete_expired_idempotency_keys(batch_size=100), 1)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+@override_settings(ORDERS_SPOOL=True)
+class OrderSpoolTest(OrderTestCase):
+    def test_order_is_created_by_worker(self):
+        response = self.post_order(self.products[:3])
+
+        self.assertEqual(response.status_code, 202)
+        tracking_id = response.json()['tracking_id']
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.client.get(f'/api/order/{tracking_id}/').json()['status'], 'accepted')
+
+        self.assertEqual(create_pending_orders(batch_size=10), (1, 1))
+
+        status = self.client.get(f'/api/order/{tracking_id}/').json()
+        self.assertEqual(status['status'], 'created')
+        order = Order.objects.get(pk=status['order'])
+        self.assertEqual(order.ordered_items.count(), 3)
+        self.assertEqual(order.ordered_items.get(product=self.burger).fixed_price, self.burger.price)
+        self.assertEqual(create_pending_orders(batch_size=10), (0, 0))
+
+    def test_batch_with_deleted_product(self):
+        for _ in range(3):
+            self.post_order(self.products[:2])
+        self.post_order(self.products[-1:])
+        deleted_product_id = self.products[-1].id
+        self.products[-1].delete()
+
+        self.assertEqual(create_pending_orders(batch_size=10), (4, 3))
+
+        rejected = PendingOrder.objects.get(order__isnull=True)
+        self.assertIn(str(deleted_product_id), rejected.error)
+        self.assertEqual(self.client.get(f'/api/order/{rejected.tracking_id}/').json()['status'], 'rejected')
+
+
+class LoadOrdersTest(OrderTestCase):
+    def test_load_orders(self):
+        Order.objects.create(firstname='Иван', lastname='Петров', phonenumber='+79001234567', address='Москва')
+        orders = [
+            {
+                'firstname': 'Иван',
+                'lastname': f'Петров {number}',
+                'phonenumber': '+79001234567',
+                'address': 'Москва, Тверская 2',
+                'products': [{'product': product.id, 'quantity': 1} for product in self.products[:number + 1]],
+            }
+            for number in range(5)
+        ]
+        lines = [json.dumps(order) for order in orders]
+        lines.insert(2, '{"firstname": "Иван"}')
+        lines.insert(4, 'not json')
+
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as jsonl:
+            jsonl.write('\n'.join(lines))
+            jsonl.flush()
+            stdout, stderr = StringIO(), StringIO()
+            call_command('load_orders', jsonl.name, batch_size=2, stdout=stdout, stderr=stderr)
+
+        self.assertIn('Загружено заказов: 5, позиций: 15, отклонено строк: 2', stdout.getvalue())
+        self.assertIn('строка 3:', stderr.getvalue())
+        self.assertIn('строка 5:', stderr.getvalue())
+        loaded_orders = Order.objects.filter(lastname__startswith='Петров ').order_by('pk')
+        self.assertEqual(
+            [order.ordered_items.count() for order in loaded_orders],
+            [1, 2, 3, 4, 5],
+        )
+        self.assertEqual(
+            loaded_orders[0].ordered_items.get().fixed_price,
+            self.burger.price,
+        )
+
+
+class SeedStarBurgerTest(TestCase):
+    def setUp(self):
+        self.until = timezone.now().replace(microsecond=0)
+
+    def seed(self):
+        call_command(
+            'seed_star_burger',
+            seed=7,
+            restaurants=3,
+            products=10,
+            addresses=50,
+            orders=40,
+            open_orders=5,
+            lines=2,
+            until=self.until,
+            batch_size=15,
+            stdout=StringIO(),
+        )
+        orders = list(
+            Order.objects
+                .order_by('pk')
+                .values_list('phonenumber', 'address', 'status', 'registered_at', 'restaurant_to_cook__name')
+        )
+        lines = list(
+            OrderProduct.objects
+                .order_by('pk')
+                .values_list('product__name', 'fixed_price', 'quantity')
+        )
+        return orders, lines
+
+    def test_seed(self):
+        orders, lines = self.seed()
+
+        self.assertEqual(len(orders), 45)
+        self.assertEqual(len(lines), 90)
+        self.assertEqual(Restaurant.objects.count(), 3)
+        self.assertEqual(Order.objects.filter(status=Order.OrderStatuses.NEW).count(), 5)
+        self.assertFalse(Order.objects.filter(status=Order.OrderStatuses.FINISHED, delivered_at=None).exists())
+
+    def test_same_seed_gives_same_data(self):
+        first_run = self.seed()
+        Order.objects.all().delete()
+        Restaurant.objects.all().delete()
+        Product.objects.all().delete()
+        ProductCategory.objects.all().delete()
+
+        self.assertEqual(self.seed(), first_run)
+
+
+class QueryStatsTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_query_stats()
+
+    def test_records_queries_by_url_name(self):
+        with self.assertLogs('foodcartapp.query_stats', 'INFO') as logs:
+            self.client.get('/api/products/')
+            self.client.get('/api/products/')
+
+        stats = get_query_stats()['foodcartapp:product_list_api']
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['max_queries'], stats['queries'])
+        self.assertEqual(stats['over_budget'], 0)
+        self.assertIn('SELECT', stats['slowest_sql'])
+        first_record, cached_record = logs.records
+        self.assertEqual(first_record.view_name, 'foodcartapp:product_list_api')
+        self.assertGreater(first_record.queries, 0)
+        self.assertEqual(cached_record.queries, 0)
+
+    @override_settings(QUERY_BUDGET=1)
+    def test_flags_requests_over_budget(self):
+        with self.assertLogs('foodcartapp.query_stats', 'WARNING') as logs:
+            self.client.post('/api/order/', {
+                'firstname': 'Иван',
+                'lastname': 'Петров',
+                'phonenumber': '+79001234567',
+                'address': 'Москва, Тверская 2',
+                'products': [{'product': self.burger.id, 'quantity': 1}],
+            }, content_type='application/json')
+
+        record, = logs.records
+        self.assertTrue(record.over_budget)
+        self.assertEqual(get_query_stats()['foodcartapp:register_order']['over_budget'], 1)
+
+
+class LoadTestOrdersTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_menu_index()
+        restaurant = Restaurant.objects.create(name='Star Burger', address='Москва, Тверская 1')
+        self.burger = Product.objects.create(name='Чизбургер', price=199, image='burger.jpg', description='')
+        RestaurantMenuItem.objects.create(restaurant=restaurant, product=self.burger)
+
+    def test_report(self):
+        order = {
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79001234567',
+            'address': 'Москва, Тверская 2',
+            'products': [{'product': self.burger.id, 'quantity': 1}],
+        }
+        lines = [json.dumps(order), json.dumps({**order, 'products': [{'product': 999, 'quantity': 1}]})]
+
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as jsonl, \
+                tempfile.NamedTemporaryFile('r', suffix='.json') as output:
+            jsonl.write('\n'.join(lines))
+            jsonl.flush()
+            stdout = StringIO()
+            call_command(
+                'load_test_orders', jsonl.name,
+                requests=5, concurrency=1, output=output.name, stdout=stdout,
+            )
+            report = json.load(output)
+
+        self.assertEqual(report['requests'], 5)
+        self.assertEqual(report['succeeded'], 3)
+        self.assertEqual(report['errors'], {'HTTP 400': 2})
+        self.assertEqual(report['lock_errors'], 0)
+        self.assertEqual(report['slow_statements']['threshold_ms'], 100)
+        latency = report['latency_ms']
+        self.assertLessEqual(latency['p50'], latency['p95'])
+        self.assertLessEqual(latency['p95'], latency['p99'])
+        self.assertLessEqual(latency['p99'], latency['max'])
+        self.assertEqual(Order.objects.count(), 3)
+        self.assertIn('3 из 5', stdout.getvalue())
+
+    def test_percentiles(self):
+        command = LoadTestOrdersCommand()
+        command.options = {'url': None, 'concurrency': 1, 'rate': None, 'slow_statement_ms': 100}
+        command.slow_statements = 0
+        results = [(milliseconds / 1000, None, False) for milliseconds in range(100, 0, -1)]
+
+        report = command.build_report(results, duration=1)
+
+        self.assertEqual(report['latency_ms'], {'p50': 50, 'p95': 95, 'p99': 99, 'max': 100})
+        self.assertEqual(report['throughput_rps'], 100)
@@ -1,12 +1,13 @@
 from django.urls import path
 
-from .views import product_list_api, banners_list_api, register_order
+from .views import product_list_api, banners_list_api, register_order, pending_order_status
 
 
 app_name = "foodcartapp"
 
 urlpatterns = [
-    path('products/', product_list_api),
-    path('banners/', banners_list_api),
-    path('order/', register_order),
+    path('products/', product_list_api, name="product_list_api"),
+    path('banners/', banners_list_api, name="banners_list_api"),
+    path('order/', register_order, name="register_order"),
+    path('order/<uuid:tracking_id>/', pending_order_status, name="pending_order_status"),
 ]
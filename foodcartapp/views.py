@@ -1,48 +1,124 @@
+import hashlib
+import math
+
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from rest_framework.serializers import ModelSerializer
+from rest_framework.serializers import IntegerField, ModelSerializer, ValidationError
 from rest_framework.renderers import JSONRenderer
 
-from django.http import JsonResponse
-from django.templatetags.static import static
+from django import forms
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.db import transaction
 
-from .models import Product, Order, OrderProduct
+from location.geocoding import enqueue_addresses_on_commit
+
+from . import fast_json
+from .banners import get_banner_payload
+from .catalog import get_catalog_version
+from .fast_json import FastJsonResponse
+from .idempotency import IDEMPOTENCY_KEY_HEADER, claim_idempotency_key, find_idempotency_key, hash_request
+from .menu_index import get_menu_index
+from .models import Product, Order, OrderProduct, PendingOrder
+from .order_spool import spool_order
 
 
 def banners_list_api(request):
-    # FIXME move data to db?
-    return JsonResponse([
-        {
-            'title': 'Burger',
-            'src': static('burger.jpg'),
-            'text': 'Tasty Burger at your door step',
-        },
-        {
-            'title': 'Spices',
-            'src': static('food.jpg'),
-            'text': 'All Cuisines',
-        },
-        {
-            'title': 'New York',
-            'src': static('tasty.jpg'),
-            'text': 'Food is incomplete without a tasty dessert',
-        }
-    ], safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    content, etag, expires_in = get_banner_payload()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    max_age = settings.BANNERS_MAX_AGE
+    if expires_in is not None:
+        max_age = min(max_age, math.ceil(expires_in))
+    patch_cache_control(response, public=True, max_age=max_age)
+    return response
+
+
+class ProductsFilter(forms.Form):
+    category = forms.IntegerField(required=False, min_value=1)
+    restaurant = forms.IntegerField(required=False, min_value=1)
+    special_status = forms.NullBooleanField(required=False)
+    page = forms.IntegerField(required=False, min_value=1)
+    page_size = forms.IntegerField(required=False, min_value=1, max_value=500)
 
 
 def product_list_api(request):
-    products = Product.objects.select_related('category').available()
+    products_filter = ProductsFilter(request.GET)
+    if not products_filter.is_valid():
+        return FastJsonResponse(
+            {field: list(errors) for field, errors in products_filter.errors.items()},
+            status=400,
+        )
+    filters = products_filter.cleaned_data
+    page = filters.pop('page')
+    page_size = filters.pop('page_size') or settings.PRODUCTS_PAGE_SIZE
+    if not page:
+        page_size = None
+
+    cache_key = ':'.join([
+        'foodcartapp:products',
+        get_catalog_version(),
+        *[f'{name}={value}' for name, value in sorted(filters.items())],
+        f'page={page}',
+        f'page_size={page_size}',
+    ])
+    cached_response = cache.get(cache_key)
+    if cached_response is None:
+        products = find_products(**filters)
+        has_next = False
+        if page:
+            products = list(products[(page - 1) * page_size:page * page_size + 1])
+            has_next = len(products) > page_size
+            products = products[:page_size]
+        content = fast_json.dumps(dump_products(products))
+        etag = f'"{hashlib.sha256(content).hexdigest()}"'
+        cached_response = (content, etag, has_next)
+        cache.set(cache_key, cached_response, timeout=settings.CATALOG_CACHE_TIMEOUT)
+
+    content, etag, has_next = cached_response
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    if has_next:
+        next_page_params = request.GET.copy()
+        next_page_params['page'] = page + 1
+        response['Link'] = f'<{request.path}?{next_page_params.urlencode()}>; rel="next"'
+    return response
 
+
+def find_products(category=None, restaurant=None, special_status=None):
+    """Return available products matching the filters, ordered by id.
+
+    Products of one restaurant are selected by its menu items, the rest
+    come from the menu index.
+    """
+    if restaurant:
+        products = Product.objects.filter(
+            menu_items__restaurant=restaurant,
+            menu_items__availability=True,
+        )
+    else:
+        products = Product.objects.available()
+    if category:
+        products = products.filter(category=category)
+    if special_status is not None:
+        products = products.filter(special_status=special_status)
+    return products.select_related('category').order_by('pk')
+
+
+def dump_products(products):
     dumped_products = []
     for product in products:
         dumped_product = {
             'id': product.id,
             'name': product.name,
-            'price': product.price,
+            'price': str(product.price),
             'special_status': product.special_status,
             'description': product.description,
             'category': {
@@ -56,13 +132,12 @@ def product_list_api(request):
             }
         }
         dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    return dumped_products
 
 
 class OrderProductSerializer(ModelSerializer):
+    product = IntegerField(min_value=1)
+
     class Meta:
         model = OrderProduct
         fields = ['product', 'quantity']
@@ -79,33 +154,137 @@ class OrderSerializer(ModelSerializer):
         model = Order
         fields = ['firstname', 'lastname', 'phonenumber', 'address', 'products']
 
+    def validate_products(self, products):
+        """Resolve all ordered products with one query and attach them to the lines.
+
+        Code validating many orders at once can pass products loaded
+        beforehand in context['products_by_id'].
+        """
+        products_by_id = self.context.get('products_by_id')
+        if products_by_id is None:
+            products_by_id = Product.objects.in_bulk({product['product'] for product in products})
+        unknown = [
+            str(product['product']) for product in products
+            if product['product'] not in products_by_id
+        ]
+        if unknown:
+            raise ValidationError(f'Нет таких товаров: {", ".join(unknown)}')
+
+        menu_index = get_menu_index()
+        unavailable = [
+            products_by_id[product['product']].name for product in products
+            if not menu_index.is_available(product['product'])
+        ]
+        if unavailable:
+            raise ValidationError(f'Нет в продаже: {", ".join(unavailable)}')
+        return [
+            {**product, 'product': products_by_id[product['product']]}
+            for product in products
+        ]
+
 
 @api_view(['POST'])
-@transaction.atomic
 def register_order(request):
+    idempotency_key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+    request_hash = None
+    if idempotency_key is not None:
+        if not 0 < len(idempotency_key) <= 255:
+            return Response(
+                {IDEMPOTENCY_KEY_HEADER: ['Ключ должен быть длиной от 1 до 255 символов.']},
+                status=400,
+            )
+        request_hash = hash_request(request.body)
+        # A retry gets the stored response even if the products it names
+        # were deleted or went off sale since the first request
+        saved_key = find_idempotency_key(idempotency_key)
+        if saved_key:
+            return replay_order_response(saved_key, request_hash)
+
     serializer = OrderSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
-    validated_data = serializer.validated_data
+    return save_order(serializer.validated_data, idempotency_key, request_hash)
+
+
+@transaction.atomic
+def save_order(validated_data, idempotency_key=None, request_hash=None):
+    """Create the order, or put it in the queue with ORDERS_SPOOL.
+
+    Validation reads happen before the transaction, so under SQLite it
+    starts with a write and waits for the database lock instead of failing
+    to upgrade a read lock.
+    """
+    if idempotency_key is not None:
+        saved_key, created = claim_idempotency_key(idempotency_key, request_hash)
+        if not created:
+            return replay_order_response(saved_key, request_hash)
+
+    if settings.ORDERS_SPOOL:
+        pending_order = spool_order(validated_data)
+        response_status = 202
+        response_data = {'tracking_id': str(pending_order.tracking_id)}
+    else:
+        order = Order.objects.create(
+            firstname=validated_data['firstname'],
+            lastname=validated_data['lastname'],
+            phonenumber=validated_data['phonenumber'],
+            address=validated_data['address'],
+        )
 
-    order = Order.objects.create(
-        firstname=validated_data['firstname'],
-        lastname=validated_data['lastname'],
-        phonenumber=validated_data['phonenumber'],
-        address=validated_data['address'],
+        ordered_products_fields = validated_data['products']
+        products_to_save = []
+        for ordered_product in ordered_products_fields:
+            products_to_save.append(OrderProduct(
+                order=order,
+                fixed_price=ordered_product['product'].price,
+                product=ordered_product['product'],
+                quantity=ordered_product['quantity']
+            ))
+        OrderProduct.objects.bulk_create(products_to_save)
+        enqueue_addresses_on_commit([order.address])
+
+        response_status = 200
+        response_data = OrderSerializer(order).data
+
+    if idempotency_key is not None:
+        saved_key.response_status = response_status
+        saved_key.response_body = response_data
+        saved_key.save(update_fields=['response_status', 'response_body'])
+    return Response(
+        response_data,
+        status=response_status,
     )
 
-    ordered_products_fields = validated_data['products']
-    products_to_save = []
-    for ordered_product in ordered_products_fields:
-        products_to_save.append(OrderProduct(
-            order=order,
-            fixed_price=ordered_product['product'].price,
-            product=ordered_product['product'],
-            quantity=ordered_product['quantity']
-        ))
-    OrderProduct.objects.bulk_create(products_to_save)
-
-    serializer = OrderSerializer(order)
+
+@api_view(['GET'])
+def pending_order_status(request, tracking_id):
+    pending_order = get_object_or_404(PendingOrder, tracking_id=tracking_id)
+    if not pending_order.processed_at:
+        status = 'accepted'
+    elif pending_order.error:
+        status = 'rejected'
+    else:
+        status = 'created'
+    return Response({
+        'tracking_id': pending_order.tracking_id,
+        'status': status,
+        'order': pending_order.order_id,
+        'error': pending_order.error,
+    })
+
+
+def replay_order_response(saved_key, request_hash):
+    if saved_key.request_hash != request_hash:
+        return Response(
+            {IDEMPOTENCY_KEY_HEADER: ['Ключ уже использован для другого заказа.']},
+            status=422,
+        )
+    if saved_key.response_status is None:
+        return Response(
+            {IDEMPOTENCY_KEY_HEADER: ['Заказ с этим ключом ещё оформляется.']},
+            status=409,
+        )
     return Response(
-        serializer.data,
+        saved_key.response_body,
+        status=saved_key.response_status,
+        headers={'Idempotent-Replayed': 'true'},
     )
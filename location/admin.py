@@ -1,9 +1,30 @@
 from django.contrib import admin
 
-from location.models import Location
+from location.geocoding import enqueue_addresses
+from location.models import Location, PendingAddress
 
 
 @admin.register(Location)
 class LocationAdmin(admin.ModelAdmin):
     readonly_fields = ['generated_at',]
-    pass
+    list_display = ['address', 'latitude', 'longitude', 'not_found_reason', 'generated_at']
+    list_filter = ['not_found_reason', 'generated_at']
+    search_fields = ['address']
+    actions = ['regeocode', 'delete_not_found']
+
+    @admin.action(description='Обновить координаты в фоне')
+    def regeocode(self, request, queryset):
+        addresses = list(queryset.values_list('address', flat=True))
+        enqueue_addresses(addresses, refresh=True)
+        self.message_user(request, f'Адресов поставлено в очередь на обновление: {len(addresses)}')
+
+    @admin.action(description='Удалить ненайденные адреса')
+    def delete_not_found(self, request, queryset):
+        deleted, _ = queryset.not_found().delete()
+        self.message_user(request, f'Удалено ненайденных адресов: {deleted}')
+
+
+@admin.register(PendingAddress)
+class PendingAddressAdmin(admin.ModelAdmin):
+    list_display = ['address', 'refresh', 'attempts', 'next_attempt_at', 'added_at']
+    readonly_fields = ['added_at']
@@ -0,0 +1,31 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def distance_matrix(from_coords, to_coords):
+    """Return distances in km between every pair of points as a NumPy array.
+
+    `from_coords` and `to_coords` are sequences of (latitude, longitude) in
+    degrees, the result has shape (len(from_coords), len(to_coords)).
+
+    Uses the haversine formula on a sphere with the mean Earth radius in
+    one vectorized float64 pass. Compared to geopy's geodesic distance on
+    WGS-84 the error is at most 0.55% of the distance anywhere on Earth
+    and at most 0.35% at Moscow latitudes, i.e. under 350 m for points
+    100 km apart. That is well below what matters for picking the nearest
+    restaurant.
+    """
+    from_coords = np.radians(np.asarray(from_coords, dtype=np.float64).reshape(-1, 2))
+    to_coords = np.radians(np.asarray(to_coords, dtype=np.float64).reshape(-1, 2))
+
+    from_lat = from_coords[:, 0, np.newaxis]
+    from_lon = from_coords[:, 1, np.newaxis]
+    to_lat = to_coords[np.newaxis, :, 0]
+    to_lon = to_coords[np.newaxis, :, 1]
+
+    haversine = (
+        np.sin((to_lat - from_lat) / 2) ** 2
+        + np.cos(from_lat) * np.cos(to_lat) * np.sin((to_lon - from_lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(haversine, 0, 1)))
@@ -0,0 +1,253 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from location.models import Location, PendingAddress
+from location.normalization import normalize_address
+from location.signals import locations_fetched
+from location.yandex_geocoder import fetch_coordinates
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_DELAY = 24 * 60 * 60
+
+
+def geocode(address):
+    """Return an unsaved Location, or None if the geocoder failed."""
+    try:
+        coords = fetch_coordinates(settings.YANDEX_APIKEY, address)
+    except requests.RequestException:
+        logger.exception('Не удалось получить координаты адреса %s', address)
+        return None
+    address_key = normalize_address(address)
+    if not coords:
+        return Location(
+            address=address,
+            address_key=address_key,
+            not_found_reason=Location.NotFoundReasons.NOT_FOUND,
+        )
+    latitude, longitude = coords
+    return Location(
+        address=address,
+        address_key=address_key,
+        latitude=float(latitude),
+        longitude=float(longitude),
+    )
+
+
+def geocode_all(addresses, max_workers=None):
+    """Geocode addresses in a bounded thread pool, return results in the same order."""
+    addresses = list(addresses)
+    if not addresses:
+        return []
+    max_workers = max_workers or settings.GEOCODER_MAX_WORKERS
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(addresses))) as executor:
+        return list(executor.map(geocode, addresses))
+
+
+def fetch_locations(addresses, max_workers=None):
+    """Geocode addresses all at once and save the results.
+
+    Lookups run in a bounded thread pool, so the wait is close to the
+    slowest single request rather than the sum of them. Results are saved
+    with one bulk_create, addresses the geocoder does not know included,
+    so they are not looked up again until GEOCODER_NOT_FOUND_TTL passes.
+    Expired "not found" rows for these addresses are replaced.
+    """
+    locations = [location for location in geocode_all(addresses, max_workers) if location]
+    if not locations:
+        return []
+
+    Location.objects \
+        .not_found() \
+        .filter(address_key__in=[location.address_key for location in locations]) \
+        .delete()
+    Location.objects.bulk_create(locations, ignore_conflicts=True)
+    locations_fetched.send(sender=Location, locations=locations)
+    return locations
+
+
+def refresh_locations(locations, max_workers=None):
+    """Geocode saved locations again and update them with one bulk_update.
+
+    If the geocoder fails, or no longer finds an address it found before,
+    the old coordinates are kept.
+    """
+    locations = list(locations)
+    fresh_locations = geocode_all([location.address for location in locations], max_workers)
+    return update_locations(locations, fresh_locations)
+
+
+def update_locations(locations, fresh_locations):
+    refreshed_at = timezone.now()
+    refreshed_locations = []
+    for location, fresh_location in zip(locations, fresh_locations):
+        if not fresh_location:
+            continue
+        if fresh_location.not_found_reason and not location.not_found_reason:
+            continue
+        location.latitude = fresh_location.latitude
+        location.longitude = fresh_location.longitude
+        location.not_found_reason = fresh_location.not_found_reason
+        location.generated_at = refreshed_at
+        refreshed_locations.append(location)
+
+    Location.objects.bulk_update(
+        refreshed_locations,
+        ['latitude', 'longitude', 'not_found_reason', 'generated_at'],
+    )
+    locations_fetched.send(sender=Location, locations=refreshed_locations)
+    return refreshed_locations
+
+
+def group_by_key(addresses):
+    addresses_by_key = {}
+    for address in addresses:
+        addresses_by_key.setdefault(normalize_address(address), []).append(address)
+    return addresses_by_key
+
+
+def find_unresolved(addresses):
+    """Return one address per normalized key that has no usable Location."""
+    addresses_by_key = group_by_key(addresses)
+    resolved_keys = Location.objects \
+        .filter(address_key__in=addresses_by_key) \
+        .resolved() \
+        .values_list('address_key', flat=True)
+    return [
+        addresses_by_key[address_key][0]
+        for address_key in set(addresses_by_key).difference(resolved_keys)
+    ]
+
+
+def locate_addresses(addresses, max_workers=None):
+    """Return {address: (latitude, longitude)} for every address that can be found.
+
+    Addresses are matched to Location by normalized key, so different
+    spellings of one address share a row. Keys without a Location row, or
+    with an expired "not found" one, are geocoded concurrently first.
+    """
+    addresses_by_key = group_by_key(addresses)
+    known_locations = Location.objects \
+        .filter(address_key__in=addresses_by_key) \
+        .resolved() \
+        .values_list('address_key', 'latitude', 'longitude')
+    coords_by_key = {}
+    resolved_keys = set()
+    for address_key, latitude, longitude in known_locations:
+        resolved_keys.add(address_key)
+        if latitude is not None:
+            coords_by_key[address_key] = (latitude, longitude)
+
+    missing_addresses = [
+        addresses_by_key[address_key][0]
+        for address_key in set(addresses_by_key).difference(resolved_keys)
+    ]
+    for location in fetch_locations(missing_addresses, max_workers=max_workers):
+        if not location.not_found_reason:
+            coords_by_key[location.address_key] = (location.latitude, location.longitude)
+
+    return {
+        address: coords_by_key[address_key]
+        for address_key, same_addresses in addresses_by_key.items() if address_key in coords_by_key
+        for address in same_addresses
+    }
+
+
+def enqueue_addresses(addresses, refresh=False):
+    """Put addresses in the queue for the geocode_addresses worker.
+
+    Addresses already waiting in the queue are skipped by the unique constraint.
+    With `refresh` the worker geocodes them again even if they already have
+    a Location.
+    """
+    addresses = set(addresses)
+    PendingAddress.objects.bulk_create(
+        [PendingAddress(address=address, refresh=refresh) for address in addresses],
+        ignore_conflicts=True,
+    )
+    if refresh:
+        PendingAddress.objects.filter(address__in=addresses, refresh=False).update(refresh=True)
+
+
+def enqueue_addresses_on_commit(addresses):
+    """Queue addresses once the current transaction commits.
+
+    The order is already saved by then, so a failed queue insert is only
+    logged: the worker can pick the address up later, while an exception
+    would turn a saved order into an error response and a retried duplicate.
+    """
+    addresses = list(addresses)
+
+    def enqueue():
+        try:
+            enqueue_addresses(addresses)
+        except DatabaseError:
+            logger.exception('Не удалось поставить адреса в очередь на геокодирование: %s', addresses)
+
+    transaction.on_commit(enqueue)
+
+
+def geocode_pending_addresses(batch_size, max_workers=None):
+    """Geocode the queued addresses that are due and drop the done ones from the queue.
+
+    Addresses the geocoder failed on stay in the queue, so an outage or an
+    open circuit breaker does not lose them. They are retried after
+    GEOCODER_RETRY_DELAY seconds, doubled with every failed attempt, so they
+    do not take the batch from newer addresses. Returns how many addresses
+    were resolved and how many of them were found.
+    """
+    now = timezone.now()
+    pending = list(
+        PendingAddress.objects
+            .filter(next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+    )
+    pending_addresses = [pending_address.address for pending_address in pending]
+    refresh_keys = {
+        normalize_address(pending_address.address) for pending_address in pending if pending_address.refresh
+    }
+
+    outdated_locations = list(Location.objects.filter(address_key__in=refresh_keys))
+    fresh_locations = geocode_all([location.address for location in outdated_locations], max_workers)
+    locations = update_locations(outdated_locations, fresh_locations)
+    locations += fetch_locations(find_unresolved(pending_addresses), max_workers=max_workers)
+
+    outdated_keys = {location.address_key for location in outdated_locations}
+    refreshed_keys = {
+        location.address_key
+        for location, fresh_location in zip(outdated_locations, fresh_locations) if fresh_location
+    }
+    resolved_keys = set(
+        Location.objects
+            .filter(address_key__in=[normalize_address(address) for address in pending_addresses])
+            .resolved()
+            .values_list('address_key', flat=True)
+    )
+    done_addresses = []
+    failed_addresses = []
+    for pending_address in pending:
+        address_key = normalize_address(pending_address.address)
+        if pending_address.refresh and address_key in outdated_keys:
+            done = address_key in refreshed_keys
+        else:
+            done = address_key in resolved_keys
+        if done:
+            done_addresses.append(pending_address.address)
+            continue
+        retry_delay = min(settings.GEOCODER_RETRY_DELAY * 2 ** pending_address.attempts, MAX_RETRY_DELAY)
+        pending_address.attempts += 1
+        pending_address.next_attempt_at = now + timedelta(seconds=retry_delay)
+        failed_addresses.append(pending_address)
+    PendingAddress.objects.filter(address__in=done_addresses).delete()
+    PendingAddress.objects.bulk_update(failed_addresses, ['attempts', 'next_attempt_at'])
+
+    found_keys = {location.address_key for location in locations if not location.not_found_reason}
+    found_addresses = [address for address in done_addresses if normalize_address(address) in found_keys]
+    return len(done_addresses), len(found_addresses)
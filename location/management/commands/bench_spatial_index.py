@@ -0,0 +1,59 @@
+import random
+import time
+
+import numpy as np
+
+from django.core.management.base import BaseCommand
+
+from location.distances import distance_matrix
+from location.spatial import GridIndex
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает поиск ближайших ресторанов по сетке с перебором всех ресторанов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=2000)
+        parser.add_argument('--orders', type=int, default=300)
+        parser.add_argument('--k', type=int, default=5)
+        parser.add_argument('--cell-size', type=float, default=5, help='размер ячейки сетки, км')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        randomizer = random.Random(options['seed'])
+
+        def random_point():
+            return 55.75 + randomizer.uniform(-0.6, 0.6), 37.62 + randomizer.uniform(-1, 1)
+
+        restaurants = [(number, *random_point()) for number in range(options['restaurants'])]
+        orders = [random_point() for _ in range(options['orders'])]
+        k = options['k']
+
+        started_at = time.perf_counter()
+        index = GridIndex(restaurants, cell_size_km=options['cell_size'])
+        build_time = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        restaurant_coords = [(latitude, longitude) for _, latitude, longitude in restaurants]
+        brute_force = []
+        for order in orders:
+            distances = distance_matrix([order], restaurant_coords)[0]
+            closest = np.argpartition(distances, k)[:k]
+            brute_force.append(sorted(zip(distances[closest].tolist(), closest.tolist())))
+        brute_force_time = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        nearest = [index.nearest(*order, k) for order in orders]
+        index_time = time.perf_counter() - started_at
+
+        mismatches = sum(
+            [key for _, key in expected] != [key for _, key in found]
+            for expected, found in zip(brute_force, nearest)
+        )
+        self.stdout.write(
+            f'{len(restaurants)} ресторанов, {len(orders)} заказов, k={k}\n'
+            f'построение сетки: {build_time * 1000:.1f} мс\n'
+            f'перебор: {brute_force_time / len(orders) * 1e6:.0f} мкс на заказ\n'
+            f'сетка: {index_time / len(orders) * 1e6:.0f} мкс на заказ\n'
+            f'расхождений с перебором: {mismatches}'
+        )
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from location.geocoding import geocode_pending_addresses
+
+
+class Command(BaseCommand):
+    help = 'Геокодирует адреса из очереди, чтобы менеджеру не приходилось ждать геокодер'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--interval', type=float, default=5, help='пауза между проверками очереди, сек')
+        parser.add_argument('--once', action='store_true', help='обработать одну пачку адресов и выйти')
+
+    def handle(self, *args, **options):
+        while True:
+            resolved, found = geocode_pending_addresses(options['batch_size'])
+            if resolved:
+                self.stdout.write(f'Обработано адресов: {resolved}, найдено: {found}')
+            if options['once']:
+                return
+            if not resolved:
+                time.sleep(options['interval'])
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from location.geocoding import refresh_locations
+from location.models import Location
+
+
+class Command(BaseCommand):
+    help = 'Заново геокодирует устаревшие или выбранные локации'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help='id локаций; по умолчанию все устаревшие')
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--rate', type=float, default=10, help='не больше стольких запросов к геокодеру в секунду')
+        parser.add_argument('--workers', type=int, help='сколько адресов геокодировать одновременно')
+
+    def handle(self, *args, **options):
+        locations = Location.objects.filter(pk__in=options['ids']) if options['ids'] else Location.objects.stale()
+        location_ids = list(locations.order_by('generated_at').values_list('pk', flat=True))
+
+        refreshed = 0
+        batch_size = options['batch_size']
+        for batch_start in range(0, len(location_ids), batch_size):
+            started_at = time.monotonic()
+            batch = list(Location.objects.filter(pk__in=location_ids[batch_start:batch_start + batch_size]))
+            refreshed += len(refresh_locations(batch, max_workers=options['workers']))
+
+            min_batch_time = len(batch) / options['rate']
+            time.sleep(max(0, min_batch_time - (time.monotonic() - started_at)))
+
+        self.stdout.write(f'Обновлено локаций: {refreshed} из {len(location_ids)}')
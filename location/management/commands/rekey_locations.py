@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from location.models import Location
+from location.normalization import normalize_address
+
+
+class Command(BaseCommand):
+    help = 'Объединяет локации с одинаковым нормализованным адресом'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='сначала пересчитать ключи всех локаций, например после изменения правил нормализации',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rekeyed = 0
+        if options['all']:
+            rekeyed = self.rekey(options['batch_size'])
+
+        duplicated_keys = Location.objects \
+            .values('address_key') \
+            .annotate(locations_count=Count('pk')) \
+            .filter(locations_count__gt=1) \
+            .values_list('address_key', flat=True)
+        merged = 0
+        for address_key in list(duplicated_keys):
+            merged += self.merge_duplicates(address_key)
+
+        self.stdout.write(f'Обновлено ключей: {rekeyed}, удалено дубликатов: {merged}')
+
+    def rekey(self, batch_size):
+        rekeyed = 0
+        batch = []
+        locations = Location.objects.only('address', 'address_key')
+        for location in locations.iterator(chunk_size=batch_size):
+            address_key = normalize_address(location.address)
+            if location.address_key == address_key:
+                continue
+            location.address_key = address_key
+            batch.append(location)
+            if len(batch) >= batch_size:
+                rekeyed += self.save_keys(batch)
+                batch = []
+        rekeyed += self.save_keys(batch)
+        return rekeyed
+
+    def save_keys(self, locations):
+        Location.objects.bulk_update(locations, ['address_key'])
+        return len(locations)
+
+    @transaction.atomic
+    def merge_duplicates(self, address_key):
+        """Keep the freshest found location for the key and delete the rest."""
+        best_location, *duplicates = Location.objects \
+            .filter(address_key=address_key) \
+            .order_by('not_found_reason', '-generated_at')
+        Location.objects.filter(pk__in=[location.pk for location in duplicates]).delete()
+        return len(duplicates)
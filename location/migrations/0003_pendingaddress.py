@@ -0,0 +1,25 @@
+# Generated by Django 3.2 on 2026-10-18 13:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location', '0002_alter_location_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingAddress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(max_length=500, unique=True, verbose_name='Адрес')),
+                ('added_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Когда добавлен в очередь')),
+            ],
+            options={
+                'verbose_name': 'Адрес в очереди на геокодирование',
+                'verbose_name_plural': 'Адреса в очереди на геокодирование',
+            },
+        ),
+    ]
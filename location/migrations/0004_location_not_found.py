@@ -0,0 +1,28 @@
+# Generated by Django 3.2 on 2026-10-18 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location', '0003_pendingaddress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='not_found_reason',
+            field=models.CharField(blank=True, choices=[('NOT_FOUND', 'Геокодер не нашёл адрес')], db_index=True, max_length=50, verbose_name='Почему не найдены координаты'),
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True, verbose_name='Широта'),
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True, verbose_name='Долгота'),
+        ),
+    ]
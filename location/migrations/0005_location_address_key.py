@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location', '0004_location_not_found'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='address_key',
+            field=models.CharField(blank=True, db_index=True, max_length=500, verbose_name='Нормализованный адрес'),
+        ),
+    ]
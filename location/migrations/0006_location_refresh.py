@@ -0,0 +1,23 @@
+# Generated by Django 3.2 on 2026-10-18 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location', '0005_location_address_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingaddress',
+            name='refresh',
+            field=models.BooleanField(default=False, verbose_name='Обновить координаты, даже если они известны'),
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='generated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Когда были получены координаты'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2 on 2026-10-18 14:23
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location', '0006_location_refresh'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingaddress',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, verbose_name='Неудачных попыток'),
+        ),
+        migrations.AddField(
+            model_name='pendingaddress',
+            name='next_attempt_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Когда геокодировать'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2 on 2026-10-18 15:02
+
+from django.db import migrations
+
+from location.normalization import normalize_address
+
+BATCH_SIZE = 1000
+
+
+def fill_address_key(apps, schema_editor):
+    Location = apps.get_model('location', 'Location')
+    locations = Location.objects.filter(address_key='').only('address', 'address_key')
+    batch = []
+    for location in locations.iterator(chunk_size=BATCH_SIZE):
+        location.address_key = normalize_address(location.address)
+        batch.append(location)
+        if len(batch) >= BATCH_SIZE:
+            Location.objects.bulk_update(batch, ['address_key'])
+            batch = []
+    Location.objects.bulk_update(batch, ['address_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location', '0007_pendingaddress_attempts'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_address_key, migrations.RunPython.noop),
+    ]
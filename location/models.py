@@ -1,30 +1,119 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+from location.normalization import normalize_address
+
+
+class LocationQuerySet(models.QuerySet):
+    def found(self):
+        return self.filter(not_found_reason='')
+
+    def not_found(self):
+        return self.exclude(not_found_reason='')
+
+    def stale(self):
+        """Found locations older than LOCATION_MAX_AGE, worth geocoding again."""
+        max_age = timedelta(days=settings.LOCATION_MAX_AGE)
+        return self.found().filter(generated_at__lt=timezone.now() - max_age)
+
+    def resolved(self):
+        """Locations that should not be geocoded again: found or recently not found."""
+        not_found_ttl = timedelta(hours=settings.GEOCODER_NOT_FOUND_TTL)
+        return self.filter(
+            models.Q(not_found_reason='') | models.Q(generated_at__gte=timezone.now() - not_found_ttl)
+        )
 
 
 class Location(models.Model):
+
+    class NotFoundReasons(models.TextChoices):
+        NOT_FOUND = 'NOT_FOUND', 'Геокодер не нашёл адрес'
+
     address = models.CharField(
         'Адрес',
         max_length=500,
         unique=True,
     )
+    address_key = models.CharField(
+        'Нормализованный адрес',
+        max_length=500,
+        blank=True,
+        db_index=True,
+    )
     latitude = models.DecimalField(
         'Широта',
         max_digits=9,
-        decimal_places=6
+        decimal_places=6,
+        blank=True,
+        null=True,
     )
     longitude = models.DecimalField(
         'Долгота',
         max_digits=9,
-        decimal_places=6
+        decimal_places=6,
+        blank=True,
+        null=True,
+    )
+    not_found_reason = models.CharField(
+        'Почему не найдены координаты',
+        max_length=50,
+        choices=NotFoundReasons.choices,
+        blank=True,
+        db_index=True,
     )
     generated_at = models.DateTimeField(
         'Когда были получены координаты',
         auto_now=True,
+        db_index=True,
     )
 
+    objects = LocationQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Локация'
         verbose_name_plural = 'Локации'
 
+    def save(self, *args, **kwargs):
+        self.address_key = normalize_address(self.address)
+        super().save(*args, **kwargs)
+
     def __str__(self):
+        if self.not_found_reason:
+            return f'{self.address} → {self.get_not_found_reason_display()}'
         return f'{self.address} → ({self.latitude}, {self.longitude})'
+
+
+class PendingAddress(models.Model):
+    address = models.CharField(
+        'Адрес',
+        max_length=500,
+        unique=True,
+    )
+    added_at = models.DateTimeField(
+        'Когда добавлен в очередь',
+        auto_now_add=True,
+        db_index=True,
+    )
+    refresh = models.BooleanField(
+        'Обновить координаты, даже если они известны',
+        default=False,
+    )
+    attempts = models.PositiveIntegerField(
+        'Неудачных попыток',
+        default=0,
+    )
+    next_attempt_at = models.DateTimeField(
+        'Когда геокодировать',
+        default=timezone.now,
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'Адрес в очереди на геокодирование'
+        verbose_name_plural = 'Адреса в очереди на геокодирование'
+
+    def __str__(self):
+        return self.address
@@ -0,0 +1,30 @@
+import re
+
+ABBREVIATIONS = {
+    'г': 'город',
+    'ул': 'улица',
+    'пр-т': 'проспект',
+    'просп': 'проспект',
+    'пер': 'переулок',
+    'пл': 'площадь',
+    'ш': 'шоссе',
+    'наб': 'набережная',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'д': 'дом',
+    'корп': 'корпус',
+    'стр': 'строение',
+    'кв': 'квартира',
+}
+
+
+def normalize_address(address):
+    """Turn an address into a key that is the same for trivially different spellings.
+
+    Case, "ё", punctuation and repeated spaces are ignored and common
+    abbreviations are expanded: "Москва, ул. Тверская, д.1" and
+    "москва улица тверская дом 1" give the same key.
+    """
+    words = re.findall(r'[\w-]+', address.casefold().replace('ё', 'е'))
+    words = [ABBREVIATIONS.get(word, word) for word in words]
+    return ' '.join(' '.join(words).replace('-', ' ').split())
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent by location.geocoding with `locations` after they were bulk-created,
+# since bulk_create does not send post_save.
+locations_fetched = Signal()
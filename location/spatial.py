@@ -0,0 +1,161 @@
+import math
+
+from location.distances import EARTH_RADIUS_KM, distance_matrix
+
+
+class GridIndex:
+    """Uniform latitude/longitude grid over points for nearest-neighbour search.
+
+    Points are (key, latitude, longitude). Cells are roughly `cell_size_km`
+    wide; a search walks rings of cells around the query point and stops as
+    soon as no unvisited cell can hold a closer point, so the work depends
+    on how many points lie near the query, not on how many are indexed.
+    Distances are haversine, see distance_matrix.
+    """
+
+    def __init__(self, points, cell_size_km=5):
+        self.cells = {}
+        self.coords = {}
+        latitudes = []
+        longitudes = []
+        for key, latitude, longitude in points:
+            self.coords[key] = (float(latitude), float(longitude))
+            latitudes.append(abs(float(latitude)))
+            longitudes.append(float(longitude))
+
+        max_latitude = min(max(latitudes, default=0), 89)
+        self.lat_step = math.degrees(cell_size_km / EARTH_RADIUS_KM)
+        self.lon_step = self.lat_step / math.cos(math.radians(max_latitude))
+        self.max_latitude = max_latitude
+        self.min_longitude = min(longitudes, default=0)
+        self.max_longitude = max(longitudes, default=0)
+        self.cell_size_km = cell_size_km
+
+        for key, (latitude, longitude) in self.coords.items():
+            self.cells.setdefault(self._cell(latitude, longitude), []).append(key)
+        rows = [row for row, _ in self.cells]
+        columns = [column for _, column in self.cells]
+        self.bounds = (min(rows), max(rows), min(columns), max(columns)) if self.cells else None
+
+    def __len__(self):
+        return len(self.coords)
+
+    def nearest(self, latitude, longitude, k, candidates=None):
+        """Return up to k [(distance_km, key)] closest to the point, nearest first.
+
+        With `candidates` only keys from that set are considered. When there
+        are no more than k of them the grid is not walked at all: they are
+        all part of the answer, and one distance_matrix call sorts them.
+        """
+        if k <= 0:
+            return []
+        if candidates is None:
+            keys = self.coords if len(self.coords) <= k else None
+        else:
+            keys = [key for key in candidates if key in self.coords]
+            if len(keys) > k:
+                keys = None
+        if keys is not None:
+            return self._measure(latitude, longitude, list(keys))
+        found = []
+        for ring, ring_found in self._walk_rings(latitude, longitude, candidates):
+            found.extend(ring_found)
+            found.sort()
+            del found[k:]
+            if len(found) == k and found[-1][0] <= self._ring_lower_bound(ring + 1, latitude, longitude):
+                break
+        return found
+
+    def within(self, latitude, longitude, radius_km, candidates=None):
+        """Return [(distance_km, key)] of points not further than radius_km, nearest first."""
+        found = []
+        for ring, ring_found in self._walk_rings(latitude, longitude, candidates):
+            found.extend(point for point in ring_found if point[0] <= radius_km)
+            if self._ring_lower_bound(ring + 1, latitude, longitude) > radius_km:
+                break
+        return sorted(found)
+
+    def _walk_rings(self, latitude, longitude, candidates):
+        """Yield (ring, [(distance_km, key)]) for rings of cells around the point.
+
+        Rings outside the bounds of the indexed points hold nothing, so the
+        walk starts at the first ring touching them and only visits the part
+        of every ring inside them. A point far away from all the indexed
+        ones, e.g. an address the geocoder put in another city, costs about
+        as much as a near one.
+        """
+        latitude, longitude = float(latitude), float(longitude)
+        center_row, center_column = self._cell(latitude, longitude)
+        first_ring, last_ring = self._rings_to_cover(center_row, center_column)
+        for ring in range(first_ring, last_ring + 1):
+            keys = []
+            for row, column in self._ring_cells(center_row, center_column, ring):
+                for key in self.cells.get((row, column), []):
+                    if candidates is None or key in candidates:
+                        keys.append(key)
+            yield ring, self._measure(latitude, longitude, keys)
+
+    def _measure(self, latitude, longitude, keys):
+        if not keys:
+            return []
+        distances = distance_matrix([(float(latitude), float(longitude))], [self.coords[key] for key in keys])[0]
+        return sorted((float(distance), key) for distance, key in zip(distances, keys))
+
+    def _cell(self, latitude, longitude):
+        return math.floor(latitude / self.lat_step), math.floor(longitude / self.lon_step)
+
+    def _ring_cells(self, center_row, center_column, ring):
+        """Cells of the ring that lie inside the bounds."""
+        min_row, max_row, min_column, max_column = self.bounds
+        if ring == 0:
+            yield center_row, center_column
+            return
+        columns = range(max(center_column - ring, min_column), min(center_column + ring, max_column) + 1)
+        for row in {center_row - ring, center_row + ring}:
+            if min_row <= row <= max_row:
+                for column in columns:
+                    yield row, column
+        rows = range(max(center_row - ring + 1, min_row), min(center_row + ring - 1, max_row) + 1)
+        for column in {center_column - ring, center_column + ring}:
+            if min_column <= column <= max_column:
+                for row in rows:
+                    yield row, column
+
+    def _rings_to_cover(self, center_row, center_column):
+        """Return the first and the last ring that hold cells inside the bounds."""
+        if not self.bounds:
+            return 0, -1
+        min_row, max_row, min_column, max_column = self.bounds
+        first_ring = max(
+            min_row - center_row,
+            center_row - max_row,
+            min_column - center_column,
+            center_column - max_column,
+            0,
+        )
+        last_ring = max(
+            abs(center_row - min_row),
+            abs(center_row - max_row),
+            abs(center_column - min_column),
+            abs(center_column - max_column),
+        )
+        return first_ring, last_ring
+
+    def _ring_lower_bound(self, ring, latitude, longitude):
+        """Shortest possible distance from the query point to any cell of the ring.
+
+        A point in the ring is at least `ring - 1` cells away in latitude or
+        in longitude. The latitude gap alone bounds the great circle
+        distance; the longitude gap does through the haversine formula, with
+        the points' cosine of latitude at its smallest and the gap measured
+        the short way round the globe. Unlike cell widths, this holds for
+        queries thousands of kilometres away. The 1% margin covers rounding.
+        """
+        cells_between = max(ring - 1, 0)
+        lat_gap_km = cells_between * self.cell_size_km
+
+        farthest_longitude = max(abs(float(longitude) - self.min_longitude), abs(float(longitude) - self.max_longitude))
+        lon_gap = math.radians(min(cells_between * self.lon_step, 180, 360 - farthest_longitude))
+        cos_product = math.cos(math.radians(float(latitude))) * math.cos(math.radians(self.max_latitude))
+        lon_gap_km = 2 * EARTH_RADIUS_KM * math.asin(min(math.sqrt(max(cos_product, 0)) * math.sin(lon_gap / 2), 1))
+        return 0.99 * min(lat_gap_km, lon_gap_km)
@@ -1,3 +1,457 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib import import_module
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+import requests
+from geopy.distance import distance
+
+from django.apps import apps
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from location.distances import distance_matrix
+from location.geocoding import enqueue_addresses, geocode_pending_addresses, locate_addresses
+from location.models import Location, PendingAddress
+from location.normalization import normalize_address
+from location.spatial import GridIndex
+from location.yandex_geocoder import GeocoderUnavailable, YandexGeocoder
+
+
+GEOCODER_DELAY = 0.05
+
+
+def fake_fetch_coordinates(apikey, address):
+    time.sleep(GEOCODER_DELAY)
+    if address.startswith('nowhere'):
+        return None
+    return '55.751244', '37.618423'
+
+
+@patch('location.geocoding.fetch_coordinates', fake_fetch_coordinates)
+class LocateAddressesTest(TestCase):
+    def test_known_addresses_are_not_geocoded(self):
+        Location.objects.create(address='Москва, Тверская 1', latitude=55.7, longitude=37.6)
+
+        with patch('location.geocoding.fetch_coordinates') as fetch_coordinates:
+            coords = locate_addresses(['Москва, Тверская 1'])
+
+        fetch_coordinates.assert_not_called()
+        self.assertEqual(list(coords), ['Москва, Тверская 1'])
+
+    def test_missing_addresses_are_saved(self):
+        coords = locate_addresses(['Москва, Арбат 2', 'nowhere'])
+
+        self.assertEqual(set(coords), {'Москва, Арбат 2'})
+        self.assertTrue(Location.objects.found().filter(address='Москва, Арбат 2').exists())
+        self.assertTrue(Location.objects.not_found().filter(address='nowhere').exists())
+
+    def test_not_found_addresses_are_cached(self):
+        locate_addresses(['nowhere'])
+
+        with patch('location.geocoding.fetch_coordinates') as fetch_coordinates:
+            coords = locate_addresses(['nowhere'])
+
+        fetch_coordinates.assert_not_called()
+        self.assertEqual(coords, {})
+
+    def test_not_found_addresses_expire(self):
+        locate_addresses(['nowhere'])
+        Location.objects.update(generated_at=timezone.now() - timedelta(days=2))
+
+        with patch('location.geocoding.fetch_coordinates', return_value=('55.7', '37.6')):
+            coords = locate_addresses(['nowhere'])
+
+        self.assertEqual(list(coords), ['nowhere'])
+        self.assertEqual(Location.objects.found().filter(address='nowhere').count(), 1)
+
+    def test_concurrent_geocoding_speedup(self):
+        addresses = [f'Москва, Тверская {number}' for number in range(50)]
+
+        started_at = time.perf_counter()
+        locate_addresses(addresses[:25], max_workers=1)
+        sequential_time = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        locate_addresses(addresses[25:], max_workers=25)
+        concurrent_time = time.perf_counter() - started_at
+
+        print(
+            f'\n25 addresses: sequential {sequential_time:.3f}s, '
+            f'concurrent {concurrent_time:.3f}s, x{sequential_time / concurrent_time:.1f}'
+        )
+        self.assertLess(concurrent_time, sequential_time / 5)
+        self.assertEqual(Location.objects.count(), 50)
+
+
+FOUND_RESPONSE = {
+    'response': {
+        'GeoObjectCollection': {
+            'featureMember': [
+                {'GeoObject': {'Point': {'pos': '37.618423 55.751244'}}},
+            ],
+        },
+    },
+}
+
+
+class FakeYandexHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        server.client_ports.add(self.client_address[1])
+        status = server.statuses.pop(0) if server.statuses else 200
+        time.sleep(server.delay)
+        body = json.dumps(FOUND_RESPONSE).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class YandexGeocoderTest(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeYandexHandler)
+        self.server.statuses = []
+        self.server.delay = 0
+        self.server.client_ports = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        host, port = self.server.server_address
+        self.geocoder = YandexGeocoder(
+            'apikey',
+            base_url=f'http://{host}:{port}/1.x',
+            read_timeout=0.2,
+            backoff_factor=0,
+            failure_threshold=2,
+            cooldown=60,
+        )
+
+    def test_connection_is_reused(self):
+        for _ in range(3):
+            coords = self.geocoder.fetch_coordinates('Москва, Тверская 1')
+
+        self.assertEqual(coords, ('55.751244', '37.618423'))
+        self.assertEqual(len(self.server.client_ports), 1)
+        self.assertEqual(self.geocoder.get_stats()['requests'], 3)
+
+    def test_server_errors_are_retried(self):
+        self.server.statuses = [503, 500]
+
+        coords = self.geocoder.fetch_coordinates('Москва, Тверская 1')
+
+        self.assertEqual(coords, ('55.751244', '37.618423'))
+        self.assertEqual(self.geocoder.get_stats()['retries'], 2)
+
+    def test_slow_response_times_out(self):
+        self.server.delay = 0.5
+
+        with self.assertRaises(requests.Timeout):
+            self.geocoder.fetch_coordinates('Москва, Тверская 1')
+        self.assertEqual(self.geocoder.get_stats()['failures'], 1)
+
+    def test_circuit_opens_after_repeated_failures(self):
+        self.server.statuses = [500] * 6
+
+        for _ in range(2):
+            with self.assertRaises(requests.HTTPError):
+                self.geocoder.fetch_coordinates('Москва, Тверская 1')
+        requests_sent = self.geocoder.get_stats()['requests']
+
+        with self.assertRaises(GeocoderUnavailable):
+            self.geocoder.fetch_coordinates('Москва, Тверская 1')
+        self.assertEqual(self.geocoder.get_stats()['requests'], requests_sent)
+        self.assertEqual(self.geocoder.get_stats()['rejected'], 1)
+
+    def test_single_trial_call_after_cooldown(self):
+        self.geocoder.cooldown = 0.1
+        self.geocoder.max_retries = 0
+        self.server.statuses = [500] * 3
+        for _ in range(2):
+            with self.assertRaises(requests.HTTPError):
+                self.geocoder.fetch_coordinates('Москва, Тверская 1')
+        time.sleep(0.15)
+
+        with self.assertRaises(requests.HTTPError):
+            self.geocoder.fetch_coordinates('Москва, Тверская 1')
+        with self.assertRaises(GeocoderUnavailable):
+            self.geocoder.fetch_coordinates('Москва, Тверская 1')
+        time.sleep(0.15)
+
+        self.server.delay = 0.1
+        trial = threading.Thread(target=self.geocoder.fetch_coordinates, args=['Москва, Тверская 1'])
+        trial.start()
+        time.sleep(0.03)
+        with self.assertRaises(GeocoderUnavailable):
+            self.geocoder.fetch_coordinates('Москва, Тверская 1')
+        trial.join()
+
+        self.assertEqual(self.geocoder.fetch_coordinates('Москва, Тверская 1'), ('55.751244', '37.618423'))
+        self.assertEqual(self.geocoder.get_stats()['requests'], 5)
+
+
+SAMPLE_ADDRESSES = [
+    'Москва, Тверская 1',
+    'москва тверская, 1 ',
+    'Москва,  Тверская 1',
+    'Москва, ул. Тверская, д. 1',
+    'москва, улица Тверская, дом 1',
+    'Москва, Ленинский пр-т, 5',
+    'Москва, Ленинский проспект 5',
+    'москва ленинский просп. 5',
+    'Москва, Арбат, 2',
+    'МОСКВА, АРБАТ 2',
+    'Москва, Новослободская 24',
+    'Москва, Новослободская, д.24',
+]
+
+
+class AddressKeyTest(TestCase):
+    def test_spellings_share_key(self):
+        self.assertEqual(
+            {normalize_address(address) for address in SAMPLE_ADDRESSES[:5]},
+            {'москва тверская 1', 'москва улица тверская дом 1'},
+        )
+        self.assertEqual(normalize_address('Москва, ул. Тверская, д.1'), 'москва улица тверская дом 1')
+
+    def test_sample_hit_rate(self):
+        raw_hits = len(SAMPLE_ADDRESSES) - len(set(SAMPLE_ADDRESSES))
+        key_hits = len(SAMPLE_ADDRESSES) - len({normalize_address(address) for address in SAMPLE_ADDRESSES})
+
+        print(
+            f'\n{len(SAMPLE_ADDRESSES)} addresses: hit rate {raw_hits / len(SAMPLE_ADDRESSES):.0%} '
+            f'by raw address, {key_hits / len(SAMPLE_ADDRESSES):.0%} by normalized key'
+        )
+        self.assertGreater(key_hits, raw_hits)
+
+    @patch('location.geocoding.fetch_coordinates', fake_fetch_coordinates)
+    def test_lookups_use_key(self):
+        locate_addresses(['Москва, Тверская 1'])
+
+        with patch('location.geocoding.fetch_coordinates') as fetch_coordinates:
+            coords = locate_addresses(['москва тверская, 1 ', 'Москва,  Тверская 1'])
+
+        fetch_coordinates.assert_not_called()
+        self.assertEqual(set(coords), {'москва тверская, 1 ', 'Москва,  Тверская 1'})
+
+    def test_rekey_merges_duplicates(self):
+        Location.objects.bulk_create([
+            Location(address='Москва, Тверская 1', not_found_reason=Location.NotFoundReasons.NOT_FOUND),
+            Location(address='москва тверская, 1', latitude=55.7, longitude=37.6),
+            Location(address='Москва, Арбат 2', latitude=55.7, longitude=37.5),
+        ])
+
+        call_command('rekey_locations', '--all', stdout=StringIO())
+
+        self.assertEqual(
+            set(Location.objects.values_list('address', 'address_key')),
+            {('москва тверская, 1', 'москва тверская 1'), ('Москва, Арбат 2', 'москва арбат 2')},
+        )
+
+    def test_migration_fills_empty_keys(self):
+        fill_address_key = import_module('location.migrations.0008_fill_address_key').fill_address_key
+        Location.objects.bulk_create([
+            Location(address='Москва, ул. Тверская, д.1', latitude=55.7, longitude=37.6),
+            Location(address='Москва, Арбат 2', address_key='москва арбат 2', latitude=55.7, longitude=37.5),
+        ])
+
+        fill_address_key(apps, schema_editor=None)
+
+        self.assertEqual(
+            set(Location.objects.values_list('address_key', flat=True)),
+            {'москва улица тверская дом 1', 'москва арбат 2'},
+        )
+        self.assertEqual(
+            locate_addresses(['москва, улица тверская, дом 1']),
+            {'москва, улица тверская, дом 1': (Decimal('55.7'), Decimal('37.6'))},
+        )
+
+
+class DistanceMatrixTest(SimpleTestCase):
+    def test_matches_geodesic_distance(self):
+        orders = [(55.751244, 37.618423), (55.55, 37.1), (56.2, 38.3)]
+        restaurants = [(55.76, 37.6), (55.9, 37.9), (55.751244, 37.618423)]
+
+        distances = distance_matrix(orders, restaurants)
+
+        self.assertEqual(distances.shape, (3, 3))
+        self.assertAlmostEqual(distances[0, 2], 0)
+        for row, order in enumerate(orders):
+            for column, restaurant in enumerate(restaurants):
+                geodesic_distance = distance(order, restaurant).km
+                self.assertLessEqual(abs(distances[row, column] - geodesic_distance), geodesic_distance * 0.0035)
+
+    def test_empty_coords(self):
+        self.assertEqual(distance_matrix([], [(55.76, 37.6)]).shape, (0, 1))
+
+
+class GridIndexTest(SimpleTestCase):
+    def setUp(self):
+        self.points = [
+            ('center', 55.751244, 37.618423),
+            ('arbat', 55.7495, 37.5915),
+            ('vdnh', 55.8263, 37.6377),
+            ('zelenograd', 55.9825, 37.1814),
+            ('podolsk', 55.4311, 37.5446),
+        ]
+        self.index = GridIndex(self.points, cell_size_km=2)
+
+    def test_nearest_matches_brute_force(self):
+        point = (55.76, 37.6)
+        distances = distance_matrix([point], [(latitude, longitude) for _, latitude, longitude in self.points])[0]
+        expected = [key for _, key in sorted(zip(distances, [key for key, _, _ in self.points]))]
+
+        self.assertEqual([key for _, key in self.index.nearest(*point, k=3)], expected[:3])
+        self.assertEqual([key for _, key in self.index.nearest(*point, k=10)], expected)
+
+    def test_nearest_among_candidates(self):
+        nearest = self.index.nearest(55.76, 37.6, k=1, candidates={'zelenograd', 'podolsk'})
+
+        self.assertEqual([key for _, key in nearest], ['zelenograd'])
+
+    def test_far_query_matches_brute_force(self):
+        for point in [(43.1155, 131.8855), (0, 0), (59.93, 30.31)]:
+            distances = distance_matrix([point], [(latitude, longitude) for _, latitude, longitude in self.points])[0]
+            expected = [key for _, key in sorted(zip(distances, [key for key, _, _ in self.points]))]
+
+            self.assertEqual([key for _, key in self.index.nearest(*point, k=2)], expected[:2])
+            self.assertEqual(
+                [key for _, key in self.index.nearest(*point, k=2, candidates={'center', 'vdnh', 'podolsk'})],
+                [key for key in expected if key in {'center', 'vdnh', 'podolsk'}][:2],
+            )
+
+    def test_far_query_does_not_walk_empty_rings(self):
+        restaurants = [(number, 55.6 + number % 8 * 0.05, 37.4 + number // 8 * 0.08) for number in range(40)]
+        index = GridIndex(restaurants)
+        even_numbers = set(range(0, 40, 2))
+
+        started_at = time.perf_counter()
+        for point in [(43.1155, 131.8855), (0, 0), (60.6871, -82.1207), (48.9481, -144.8335)]:
+            every_restaurant = index._measure(*point, index.coords)
+            self.assertEqual(index.nearest(*point, k=5), every_restaurant[:5])
+            self.assertEqual(
+                index.nearest(*point, k=5, candidates=even_numbers),
+                [(distance, key) for distance, key in every_restaurant if key in even_numbers][:5],
+            )
+            self.assertEqual(index.nearest(*point, k=5, candidates={1, 2}), index._measure(*point, [1, 2]))
+        self.assertLess(time.perf_counter() - started_at, 0.5)
+
+    def test_few_candidates(self):
+        self.assertEqual(self.index.nearest(43.1155, 131.8855, k=5, candidates=set()), [])
+        self.assertEqual(self.index.nearest(43.1155, 131.8855, k=5, candidates={'unknown'}), [])
+        self.assertEqual(
+            [key for _, key in self.index.nearest(55.76, 37.6, k=5, candidates={'podolsk', 'arbat'})],
+            ['arbat', 'podolsk'],
+        )
+
+    def test_within_radius(self):
+        within = self.index.within(55.76, 37.6, radius_km=10)
+
+        self.assertEqual({key for _, key in within}, {'center', 'arbat', 'vdnh'})
+        self.assertEqual(GridIndex([]).within(55.76, 37.6, radius_km=10), [])
+        self.assertEqual(self.index.within(43.1155, 131.8855, radius_km=10), [])
+
+
+@patch('location.geocoding.fetch_coordinates', return_value=('55.8', '37.7'))
+class RefreshLocationsTest(TestCase):
+    def setUp(self):
+        Location.objects.bulk_create([
+            Location(address='Москва, Тверская 1', address_key='москва тверская 1', latitude=55.7, longitude=37.6),
+            Location(address='Москва, Арбат 2', address_key='москва арбат 2', latitude=55.7, longitude=37.5),
+        ])
+        Location.objects.filter(address='Москва, Тверская 1').update(generated_at=timezone.now() - timedelta(days=365))
+
+    def test_stale_locations_are_regeocoded(self, fetch_coordinates):
+        call_command('regeocode_locations', '--rate', '1000', stdout=StringIO())
+
+        fetch_coordinates.assert_called_once()
+        self.assertEqual(
+            set(Location.objects.values_list('address', 'latitude')),
+            {('Москва, Тверская 1', Decimal('55.8')), ('Москва, Арбат 2', Decimal('55.7'))},
+        )
+        self.assertFalse(Location.objects.stale().exists())
+
+    def test_rate_limit_counts_sent_addresses(self, fetch_coordinates):
+        with patch('location.management.commands.regeocode_locations.time.sleep') as sleep:
+            call_command('regeocode_locations', '--rate', '1', '--batch-size', '50', stdout=StringIO())
+
+        (pause,), _ = sleep.call_args
+        self.assertLessEqual(pause, 1)
+
+    def test_queued_refresh(self, fetch_coordinates):
+        enqueue_addresses(['москва арбат, 2'], refresh=True)
+
+        geocode_pending_addresses(batch_size=10)
+
+        self.assertEqual(Location.objects.get(address='Москва, Арбат 2').latitude, Decimal('55.8'))
+
+    def test_failed_addresses_stay_queued(self, fetch_coordinates):
+        enqueue_addresses(['Москва, Мясницкая 3'])
+        enqueue_addresses(['москва арбат, 2'], refresh=True)
+        fetch_coordinates.side_effect = GeocoderUnavailable('Геокодер недоступен')
+
+        self.assertEqual(geocode_pending_addresses(batch_size=10), (0, 0))
+
+        self.assertEqual(PendingAddress.objects.count(), 2)
+        self.assertFalse(PendingAddress.objects.filter(attempts=0).exists())
+        self.assertFalse(Location.objects.filter(address='Москва, Мясницкая 3').exists())
+
+        fetch_coordinates.reset_mock(side_effect=True)
+        self.assertEqual(geocode_pending_addresses(batch_size=10), (0, 0))
+        fetch_coordinates.assert_not_called()
+
+        PendingAddress.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(geocode_pending_addresses(batch_size=10), (2, 2))
+
+        self.assertFalse(PendingAddress.objects.exists())
+        self.assertTrue(Location.objects.found().filter(address='Москва, Мясницкая 3').exists())
+        self.assertEqual(Location.objects.get(address='Москва, Арбат 2').latitude, Decimal('55.8'))
+
+    def test_failed_addresses_back_off(self, fetch_coordinates):
+        fetch_coordinates.side_effect = GeocoderUnavailable('Геокодер недоступен')
+        enqueue_addresses(['Москва, Мясницкая 3'])
+        retry_delays = []
+        for _ in range(3):
+            started_at = timezone.now()
+            geocode_pending_addresses(batch_size=10)
+            pending_address = PendingAddress.objects.get()
+            retry_delays.append(round((pending_address.next_attempt_at - started_at).total_seconds()))
+            PendingAddress.objects.update(next_attempt_at=started_at)
+
+        self.assertEqual(retry_delays, [60, 120, 240])
+        self.assertEqual(PendingAddress.objects.get().attempts, 3)
+
+    def test_failed_addresses_do_not_block_queue(self, fetch_coordinates):
+        fetch_coordinates.side_effect = self.fail_on_address('Москва, Неглинная 1')
+        enqueue_addresses(['Москва, Неглинная 1'])
+        enqueue_addresses(['Москва, Мясницкая 3'])
+
+        call_command('geocode_addresses', '--once', '--batch-size', '1', stdout=StringIO())
+        call_command('geocode_addresses', '--once', '--batch-size', '1', stdout=StringIO())
+
+        self.assertEqual(list(PendingAddress.objects.values_list('address', flat=True)), ['Москва, Неглинная 1'])
+        self.assertTrue(Location.objects.found().filter(address='Москва, Мясницкая 3').exists())
+
+    @staticmethod
+    def fail_on_address(failing_address):
+        def fetch_coordinates(apikey, address):
+            if address == failing_address:
+                raise GeocoderUnavailable('Геокодер недоступен')
+            return '55.8', '37.7'
+        return fetch_coordinates
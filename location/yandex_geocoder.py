@@ -1,19 +1,154 @@
+import logging
+import random
+import threading
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class GeocoderUnavailable(requests.RequestException):
+    """Geocoder failed too many times in a row, calls are rejected for a while."""
+
+
+class YandexGeocoder:
+    """Yandex geocoder client that is safe to share between threads.
+
+    Keeps connections alive in a pooled session, bounds every request with
+    connect and read timeouts and retries network errors and 5xx responses
+    with jittered exponential backoff. After `failure_threshold` failed calls
+    in a row the circuit opens and calls fail fast with GeocoderUnavailable
+    for `cooldown` seconds. Then a single trial call is let through while
+    the others are still rejected: its success closes the circuit, its
+    failure opens it for another cooldown.
+    """
+
+    base_url = 'https://geocode-maps.yandex.ru/1.x'
+
+    def __init__(self, apikey, base_url=None, connect_timeout=3.05, read_timeout=10,
+                 max_retries=2, backoff_factor=0.5, max_backoff=8,
+                 failure_threshold=5, cooldown=30, pool_size=10):
+        self.apikey = apikey
+        self.base_url = base_url or self.base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._lock = threading.Lock()
+        self._failures_in_row = 0
+        self._opened_until = 0
+        self._trial_call = False
+        self.stats = {
+            'calls': 0,
+            'requests': 0,
+            'retries': 0,
+            'failures': 0,
+            'rejected': 0,
+            'latency_total': 0.0,
+            'latency_max': 0.0,
+        }
+
+    def fetch_coordinates(self, address):
+        self._check_circuit()
+        with self._lock:
+            self.stats['calls'] += 1
+
+        try:
+            response = self._get_with_retries(address)
+        except requests.RequestException:
+            self._record_failure()
+            raise
+        self._record_success()
+        response.raise_for_status()
+        found_places = response.json()['response']['GeoObjectCollection']['featureMember']
+
+        if not found_places:
+            return None
+
+        most_relevant = found_places[0]
+        lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
+        return lat, lon
+
+    def _get_with_retries(self, address):
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self._get(address)
+                if response.status_code in RETRY_STATUSES:
+                    response.raise_for_status()
+                return response
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError):
+                if attempt == self.max_retries:
+                    raise
+                with self._lock:
+                    self.stats['retries'] += 1
+                time.sleep(random.uniform(0, min(self.max_backoff, self.backoff_factor * 2 ** attempt)))
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def _get(self, address):
+        started_at = time.perf_counter()
+        try:
+            return self.session.get(self.base_url, timeout=self.timeout, params={
+                "geocode": address,
+                "apikey": self.apikey,
+                "format": "json",
+            })
+        finally:
+            latency = time.perf_counter() - started_at
+            with self._lock:
+                self.stats['requests'] += 1
+                self.stats['latency_total'] += latency
+                self.stats['latency_max'] = max(self.stats['latency_max'], latency)
+            logger.debug('Геокодер ответил за %.3f с: %s', latency, address)
+
+    def _check_circuit(self):
+        with self._lock:
+            if self._failures_in_row < self.failure_threshold:
+                return
+            if time.monotonic() >= self._opened_until and not self._trial_call:
+                self._trial_call = True
+                return
+            self.stats['rejected'] += 1
+            raise GeocoderUnavailable('Геокодер недоступен, запросы временно не отправляются')
+
+    def _record_success(self):
+        with self._lock:
+            self._failures_in_row = 0
+            self._trial_call = False
+
+    def _record_failure(self):
+        with self._lock:
+            self.stats['failures'] += 1
+            self._failures_in_row += 1
+            self._trial_call = False
+            if self._failures_in_row >= self.failure_threshold:
+                self._opened_until = time.monotonic() + self.cooldown
+                logger.warning('Геокодер отключён на %s с после %s ошибок подряд',
+                               self.cooldown, self._failures_in_row)
+
+
+_geocoders = {}
+
+
+def get_geocoder(apikey):
+    if apikey not in _geocoders:
+        _geocoders[apikey] = YandexGeocoder(apikey)
+    return _geocoders[apikey]
 
 
 def fetch_coordinates(apikey, address):
-    base_url = "https://geocode-maps.yandex.ru/1.x"
-    response = requests.get(base_url, params={
-        "geocode": address,
-        "apikey": apikey,
-        "format": "json",
-    })
-    response.raise_for_status()
-    found_places = response.json()['response']['GeoObjectCollection']['featureMember']
-
-    if not found_places:
-        return None
-
-    most_relevant = found_places[0]
-    lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
-    return lat, lon
+    return get_geocoder(apikey).fetch_coordinates(address)
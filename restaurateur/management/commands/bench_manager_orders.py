@@ -0,0 +1,193 @@
+import json
+import random
+import time
+import tracemalloc
+import uuid
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.template.loader import render_to_string
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from foodcartapp.menu_index import build_menu_index, get_menu_index, invalidate_menu_index
+from foodcartapp.models import Order
+from foodcartapp.synthetic import (create_catalog, create_orders, fake_fetch_coordinates,
+                                   random_address)
+from location.geocoding import locate_addresses
+from restaurateur.views import fetch_restaurants_to_order
+
+DEFAULT_SCALES = ['10:100:100:3', '50:300:1000:5', '200:1000:3000:8']
+
+
+class Command(BaseCommand):
+    help = 'Замеряет этапы страницы заказов менеджера на синтетических данных. ' \
+           'Данные создаются в транзакции и откатываются, геокодер заменён заглушкой. ' \
+           'Для сравнимых цифр запускайте на пустой БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', action='append', dest='scales',
+                            help='рестораны:товары:заказы:позиций в заказе, можно повторять; '
+                                 f'по умолчанию {" ".join(DEFAULT_SCALES)}')
+        parser.add_argument('--repeat', type=int, default=3, help='повторов каждого этапа, берётся лучшее время')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='куда записать результаты в JSON')
+        parser.add_argument('--baseline', help='JSON прошлого запуска для сравнения')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='допустимое замедление относительно --baseline, доля')
+        parser.add_argument('--min-delta-ms', type=float, default=5,
+                            help='замедление меньше этого не считается регрессией, мс')
+
+    def handle(self, *args, **options):
+        results = {
+            'finished_at': None,
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'seed': options['seed'],
+            'scales': [],
+        }
+        for label in options['scales'] or DEFAULT_SCALES:
+            try:
+                restaurants, products, orders, lines = [int(number) for number in label.split(':')]
+            except ValueError:
+                raise CommandError(f'Масштаб «{label}» не в формате рестораны:товары:заказы:позиций')
+            stages = self.run_scale(restaurants, products, orders, lines, options)
+            results['scales'].append({
+                'label': label,
+                'restaurants': restaurants,
+                'products': products,
+                'orders': orders,
+                'lines': lines,
+                'stages': stages,
+            })
+            self.print_stages(label, stages)
+        results['finished_at'] = timezone.now().isoformat()
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                self.check_regressions(json.load(baseline), results, options['threshold'], options['min_delta_ms'])
+
+    def run_scale(self, restaurants, products, orders_count, lines, options):
+        with transaction.atomic():
+            randomizer = random.Random(options['seed'])
+            _, product_prices = create_catalog(randomizer, restaurants, products)
+            addresses = [random_address(randomizer) for _ in range(max(orders_count // 2, 1))]
+            first_order_id = (Order.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+            create_orders(randomizer, orders_count, lines, product_prices, addresses)
+            invalidate_menu_index()
+
+            manager = User.objects.create(username=f'bench-{uuid.uuid4().hex}', is_staff=True)
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(manager)
+            request = RequestFactory().get('/manager/orders/')
+            request.user = manager
+
+            orders_queryset = Order.objects \
+                .for_managers() \
+                .filter(pk__gte=first_order_id) \
+                .order_by('restaurant_to_cook', '-pk')
+            state = {}
+
+            def fetch_capabilities():
+                state['orders'] = list(orders_queryset.fetch_restaurants_can_cook_order())
+
+            def locate():
+                state['coords'] = locate_addresses({order.address for order in state['orders']})
+
+            def sort_by_distance():
+                with mock.patch('restaurateur.views.locate_addresses', return_value=state['coords']):
+                    fetch_restaurants_to_order(state['orders'], get_menu_index())
+
+            def render_orders():
+                render_to_string('order_items.html', request=request, context={
+                    'orders': state['orders'],
+                    'page_size': len(state['orders']),
+                    'is_first_page': True,
+                    'changes_cursor': timezone.now().isoformat(),
+                })
+
+            def view_page():
+                client.get('/manager/orders/')
+
+            def view_stream():
+                b''.join(client.get('/manager/orders/', {'stream': 1}).streaming_content)
+
+            stages = {}
+            with mock.patch('location.geocoding.fetch_coordinates', fake_fetch_coordinates):
+                for name, stage, repeatable in [
+                    ('menu_index', build_menu_index, True),
+                    ('capabilities', fetch_capabilities, True),
+                    ('geocode_cold', locate, False),
+                    ('geocode_cached', locate, True),
+                    ('distance_sort', sort_by_distance, True),
+                    ('render', render_orders, True),
+                    ('view_page', view_page, True),
+                    ('view_stream', view_stream, True),
+                ]:
+                    stages[name] = self.measure(stage, options['repeat'] if repeatable else 1, repeatable)
+
+            transaction.set_rollback(True)
+        invalidate_menu_index()
+        return stages
+
+    @staticmethod
+    def measure(stage, repeat, measure_memory):
+        """Best time of `repeat` runs, queries of the first one, peak memory of an extra traced run."""
+        timings = []
+        for attempt in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started_at = time.perf_counter()
+                stage()
+                timings.append(time.perf_counter() - started_at)
+            if not attempt:
+                queries_count = len(queries)
+
+        peak_memory_kb = None
+        if measure_memory:
+            tracemalloc.start()
+            stage()
+            peak_memory_kb = round(tracemalloc.get_traced_memory()[1] / 1024)
+            tracemalloc.stop()
+
+        return {
+            'seconds': round(min(timings), 6),
+            'queries': queries_count,
+            'peak_memory_kb': peak_memory_kb,
+        }
+
+    def print_stages(self, label, stages):
+        self.stdout.write(f'масштаб {label} (рестораны:товары:заказы:позиций)')
+        for name, stage in stages.items():
+            memory = f'{stage["peak_memory_kb"]} КБ' if stage['peak_memory_kb'] is not None else '—'
+            self.stdout.write(
+                f'  {name:<15} {stage["seconds"] * 1000:>9.1f} мс  '
+                f'запросов: {stage["queries"]:<4} память: {memory}'
+            )
+
+    def check_regressions(self, baseline, results, threshold, min_delta_ms):
+        baseline_scales = {scale['label']: scale['stages'] for scale in baseline['scales']}
+        regressions = []
+        for scale in results['scales']:
+            for name, stage in scale['stages'].items():
+                baseline_stage = baseline_scales.get(scale['label'], {}).get(name)
+                if not baseline_stage:
+                    continue
+                slowdown_ms = (stage['seconds'] - baseline_stage['seconds']) * 1000
+                if stage['seconds'] > baseline_stage['seconds'] * (1 + threshold) and slowdown_ms > min_delta_ms:
+                    regressions.append(
+                        f'{scale["label"]} {name}: {baseline_stage["seconds"] * 1000:.1f} → '
+                        f'{stage["seconds"] * 1000:.1f} мс'
+                    )
+                if stage['queries'] > baseline_stage['queries']:
+                    regressions.append(
+                        f'{scale["label"]} {name}: запросов {baseline_stage["queries"]} → {stage["queries"]}'
+                    )
+        if regressions:
+            raise CommandError('Регрессия относительно базового запуска:\n' + '\n'.join(regressions))
+        self.stdout.write(f'Регрессий относительно базового запуска нет, порог {threshold:.0%}')
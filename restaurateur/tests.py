@@ -1,3 +1,288 @@
-from django.test import TestCase
+import json
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from foodcartapp.menu_index import get_menu_index, invalidate_menu_index
+from foodcartapp.models import Order, OrderProduct, Product, Restaurant, RestaurantMenuItem
+from foodcartapp.query_stats import reset_query_stats
+from foodcartapp.synthetic import fake_fetch_coordinates
+from restaurateur import views
+
+STAGES = [
+    'menu_index', 'capabilities', 'geocode_cold', 'geocode_cached',
+    'distance_sort', 'render', 'view_page', 'view_stream',
+]
+
+
+class ManagerOrdersTestCase(TestCase):
+    def setUp(self):
+        geocoder = mock.patch('location.geocoding.fetch_coordinates', fake_fetch_coordinates)
+        geocoder.start()
+        self.addCleanup(geocoder.stop)
+        cache.clear()
+        invalidate_menu_index()
+        manager = User.objects.create_user('manager', is_staff=True)
+        self.client.force_login(manager)
+        self.burger = Product.objects.create(name='Чизбургер', price=199, image='burger.jpg', description='')
+        self.restaurants = [
+            Restaurant.objects.create(name=f'Star Burger {number}', address=f'Москва, Тверская {number}')
+            for number in range(1, 3)
+        ]
+        for restaurant in self.restaurants:
+            RestaurantMenuItem.objects.create(restaurant=restaurant, product=self.burger)
+
+    def create_order(self, **fields):
+        order = Order.objects.create(**{
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79001234567',
+            'address': 'Москва, Арбат 2',
+            **fields,
+        })
+        OrderProduct.objects.create(order=order, product=self.burger, fixed_price=self.burger.price, quantity=1)
+        return order
+
+
+class ViewOrdersTest(ManagerOrdersTestCase):
+    def test_restaurants_are_measured_with_one_index(self):
+        order = self.create_order()
+
+        with mock.patch.object(views, 'get_menu_index', wraps=get_menu_index) as get_index:
+            response = self.client.get('/manager/orders/')
+
+        get_index.assert_called_once()
+        listed_order, = response.context['orders']
+        self.assertEqual(listed_order.id, order.id)
+        distances = [distance for distance, _ in listed_order.restaurants_to_order]
+        self.assertEqual(len(distances), 2)
+        self.assertTrue(all(distance > 0 for distance in distances))
+        self.assertEqual(distances, sorted(distances))
+
+
+class OrdersPaginationTest(ManagerOrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.orders = [self.create_order() for _ in range(5)]
+        self.create_order(status=Order.OrderStatuses.FINISHED)
+        self.create_order(restaurant_to_cook=self.restaurants[0])
+
+    def get_page(self, **params):
+        response = self.client.get('/manager/orders/', params)
+        self.assertEqual(response.status_code, 200)
+        return [order.id for order in response.context['orders']], response.context['next_after']
+
+    def test_pages_follow_cursor(self):
+        order_ids = [order.id for order in reversed(self.orders)]
+
+        self.assertEqual(self.get_page(page_size=2), (order_ids[:2], order_ids[1]))
+        self.assertEqual(self.get_page(page_size=2, after=order_ids[1]), (order_ids[2:4], order_ids[3]))
+        self.assertEqual(self.get_page(page_size=2, after=order_ids[3]), (order_ids[4:], None))
+
+    def test_exact_last_page_has_no_next(self):
+        self.assertEqual(self.get_page(page_size=5), ([order.id for order in reversed(self.orders)], None))
+
+    def test_invalid_cursor_shows_first_page(self):
+        response = self.client.get('/manager/orders/', {'after': 'abc', 'page_size': 2})
+
+        self.assertTrue(response.context['is_first_page'])
+        self.assertEqual(len(response.context['orders']), len(self.orders))
+
+    def test_look_ahead_order_is_not_processed(self):
+        with mock.patch.object(
+            type(get_menu_index()), 'restaurants_can_cook', autospec=True, return_value=set(),
+        ) as restaurants_can_cook:
+            self.get_page(page_size=2)
+
+        self.assertEqual(restaurants_can_cook.call_count, 2)
+
+
+class OrdersStreamTest(ManagerOrdersTestCase):
+    def test_rows_are_streamed_inside_page(self):
+        orders = [self.create_order() for _ in range(5)]
+        self.create_order(status=Order.OrderStatuses.FINISHED)
+
+        response = self.client.get('/manager/orders/', {'stream': 1, 'page_size': 2})
+        page = b''.join(response.streaming_content).decode()
+
+        self.assertNotIn(views.ORDER_ROWS_PLACEHOLDER, page)
+        self.assertNotIn('class="pager"', page)
+        rows_start = page.index('<th>Ссылка на админку</th>')
+        rows_end = page.index('</table>')
+        self.assertLess(rows_start, rows_end)
+        self.assertTrue(page.rstrip().endswith('</html>'))
+        row_ids = [
+            int(row.split('"', 1)[0])
+            for row in page[rows_start:rows_end].split('<tr id="order-')[1:]
+        ]
+        self.assertEqual(row_ids, [order.id for order in reversed(orders)])
+        self.assertEqual(page.count('Star Burger 1 - '), len(orders))
+
+    def test_empty_queue(self):
+        response = self.client.get('/manager/orders/', {'stream': 1})
+        page = b''.join(response.streaming_content).decode()
+
+        self.assertIn('<th>Ссылка на админку</th>', page)
+        self.assertNotIn('<tr id="order-', page)
+
+
+class OrderChangesTest(ManagerOrdersTestCase):
+    def get_changes(self, since):
+        if not isinstance(since, tuple):
+            since = (since, 0)
+        response = self.client.get('/manager/orders/changes/', {'since': views.format_cursor(since)})
+        self.assertEqual(response.status_code, 200)
+        changes = response.json()
+        return views.parse_cursor(changes['cursor']), {order['id']: order for order in changes['orders']}
+
+    def test_queued_and_removed_orders(self):
+        since = timezone.now() - timedelta(minutes=1)
+        queued_order = self.create_order()
+        picked_order = self.create_order()
+        picked_order.restaurant_to_cook = self.restaurants[0]
+        picked_order.save()
+        finished_order = self.create_order()
+        Order.objects.filter(pk=finished_order.pk).update(status=Order.OrderStatuses.FINISHED)
+
+        _, changed_orders = self.get_changes(since)
+
+        self.assertEqual(set(changed_orders), {queued_order.id, picked_order.id, finished_order.id})
+        self.assertFalse(changed_orders[queued_order.id]['removed'])
+        self.assertIn(f'id="order-{queued_order.id}"', changed_orders[queued_order.id]['html'])
+        self.assertTrue(changed_orders[picked_order.id]['removed'])
+        self.assertTrue(changed_orders[finished_order.id]['removed'])
+
+    def test_recent_changes_are_sent_again(self):
+        since = timezone.now() - timedelta(minutes=1)
+        order = self.create_order()
+
+        cursor, changed_orders = self.get_changes(since)
+        self.assertIn(order.id, changed_orders)
+        self.assertLessEqual(cursor, (timezone.now() - views.ORDER_CHANGES_OVERLAP, 0))
+
+        _, changed_orders = self.get_changes(cursor)
+        self.assertIn(order.id, changed_orders)
+
+    def test_limit_does_not_split_equal_updated_at(self):
+        changed_at = timezone.now() - timedelta(minutes=5)
+        orders = [self.create_order() for _ in range(3)]
+        Order.objects.filter(pk=orders[0].pk).update(updated_at=changed_at - timedelta(seconds=1))
+        Order.objects.filter(pk__in=[orders[1].pk, orders[2].pk]).update(updated_at=changed_at)
+
+        with mock.patch.object(views, 'ORDER_CHANGES_LIMIT', 2):
+            cursor, first_changes = self.get_changes(changed_at - timedelta(minutes=1))
+            _, second_changes = self.get_changes(cursor)
+
+        self.assertEqual(len(first_changes), 2)
+        self.assertEqual({*first_changes, *second_changes}, {order.id for order in orders})
+
+    def test_feed_moves_past_orders_sharing_updated_at(self):
+        orders = [self.create_order() for _ in range(3)]
+        changed_at = timezone.now() - timedelta(minutes=5)
+        Order.objects.filter(pk__in=[order.pk for order in orders]).update(updated_at=changed_at)
+
+        cursor = (changed_at - timedelta(minutes=1), 0)
+        seen_orders = []
+        with mock.patch.object(views, 'ORDER_CHANGES_LIMIT', 2):
+            for _ in range(3):
+                cursor, changed_orders = self.get_changes(cursor)
+                seen_orders += changed_orders
+
+        self.assertEqual(seen_orders, [order.id for order in orders])
+        self.assertEqual(cursor, (changed_at, orders[-1].id))
+
+    def test_cursor_round_trip(self):
+        cursor = (timezone.now(), 42)
+
+        self.assertEqual(views.parse_cursor(views.format_cursor(cursor)), cursor)
+        self.assertEqual(views.parse_cursor(cursor[0].isoformat()), (cursor[0], 0))
+        self.assertIsNone(views.parse_cursor('вчера'))
+        self.assertIsNone(views.parse_cursor(f'{cursor[0].isoformat()},abc'))
+
+    def test_bulk_update_bumps_updated_at(self):
+        order = self.create_order()
+        Order.objects.filter(pk=order.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        since = timezone.now() - timedelta(minutes=1)
+
+        order.status = Order.OrderStatuses.COOKING
+        Order.objects.bulk_update([order], ['status'])
+
+        _, changed_orders = self.get_changes(since)
+        self.assertIn(order.id, changed_orders)
+
+    def test_events_stream_is_opt_in(self):
+        since = (timezone.now() - timedelta(minutes=1)).isoformat()
+
+        response = self.client.get('/manager/orders/events/', {'since': since})
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('EventSource', self.client.get('/manager/orders/').content.decode())
+
+        with self.settings(ORDER_EVENTS_SSE=True, ORDER_EVENTS_DURATION=0):
+            response = self.client.get('/manager/orders/events/', {'since': since})
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            self.assertIn('EventSource', self.client.get('/manager/orders/').content.decode())
+
+
+class BenchManagerOrdersTest(TestCase):
+    def run_bench(self, **options):
+        with tempfile.NamedTemporaryFile('r', suffix='.json') as output:
+            call_command(
+                'bench_manager_orders',
+                scales=['3:10:20:2'],
+                repeat=1,
+                output=output.name,
+                stdout=StringIO(),
+                **options,
+            )
+            return json.load(output)
+
+    def test_results(self):
+        results = self.run_bench()
+
+        scale, = results['scales']
+        self.assertEqual(scale['orders'], 20)
+        self.assertEqual(list(scale['stages']), STAGES)
+        self.assertEqual(scale['stages']['distance_sort']['queries'], 0)
+        self.assertEqual(scale['stages']['geocode_cached']['queries'], 1)
+        self.assertIsNone(scale['stages']['geocode_cold']['peak_memory_kb'])
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(Restaurant.objects.exists())
+
+    def test_regression_check(self):
+        results = self.run_bench()
+        for stage in results['scales'][0]['stages'].values():
+            stage['queries'] = 0
+
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as baseline:
+            json.dump(results, baseline)
+            baseline.flush()
+            with self.assertRaisesMessage(CommandError, 'capabilities: запросов 0 → 2'):
+                self.run_bench(baseline=baseline.name)
+
+
+class QueryStatsViewTest(TestCase):
+    def setUp(self):
+        reset_query_stats()
+        manager = User.objects.create_user('manager', is_staff=True)
+        self.client.force_login(manager)
+        Order.objects.create(firstname='Иван', lastname='Петров', phonenumber='+79001234567', address='Москва')
+
+    @override_settings(QUERY_BUDGET=1)
+    def test_stream_is_recorded_when_finished(self):
+        response = self.client.get('/manager/orders/', {'stream': 1})
+        self.assertFalse(self.client.get('/manager/query-stats/').json().get('restaurateur:view_orders'))
+
+        b''.join(response.streaming_content)
+
+        stats = self.client.get('/manager/query-stats/').json()['restaurateur:view_orders']
+        self.assertEqual(stats['requests'], 1)
+        self.assertGreater(stats['queries'], 1)
+        self.assertEqual(stats['over_budget'], 0)
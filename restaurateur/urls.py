@@ -12,6 +12,10 @@ urlpatterns = [
     path('restaurants/', views.view_restaurants, name="RestaurantView"),
 
     path('orders/', views.view_orders, name="view_orders"),
+    path('orders/changes/', views.view_order_changes, name="view_order_changes"),
+    path('orders/events/', views.view_order_events, name="view_order_events"),
+
+    path('query-stats/', views.view_query_stats, name="view_query_stats"),
 
     path('login/', views.LoginView.as_view(), name="login"),
     path('logout/', views.LogoutView.as_view(), name="logout"),
@@ -1,6 +1,10 @@
-from geopy.distance import distance
+import json
+import time
+from datetime import timedelta
 
 from django import forms
+from django.http import Http404, JsonResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.shortcuts import redirect, render
 from django.views import View
 from django.urls import reverse_lazy
@@ -9,13 +13,23 @@ from django.contrib.auth.decorators import user_passes_test
 from django.conf import settings
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
-from django.db.models import Subquery, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.db.models import Q
 
-from foodcartapp.models import Product, Restaurant, Order, OrderProduct, RestaurantMenuItem
-from location.models import Location
-from location.yandex_geocoder import fetch_coordinates
+from foodcartapp.menu_index import get_menu_index
+from foodcartapp.models import Product, Restaurant, Order
+from foodcartapp.query_stats import get_query_stats
+from location.distances import distance_matrix
+from location.geocoding import locate_addresses
 
-YANDEX_APIKEY = settings.YANDEX_APIKEY
+ORDER_ROWS_PLACEHOLDER = '<!-- order rows -->'
+
+# An order saved just before a read may commit after it, so the cursor
+# never moves closer than this to the present. Recent changes are sent
+# again on the next read; patching a row twice is harmless.
+ORDER_CHANGES_OVERLAP = timedelta(seconds=2)
+ORDER_CHANGES_LIMIT = 500
 
 
 class Login(forms.Form):
@@ -101,45 +115,253 @@ def view_restaurants(request):
     })
 
 
-def get_or_fetch_coords(obj):
-    if obj.latitude and obj.longitude:
-        return obj.latitude, obj.longitude
-    else:
-        coords = fetch_coordinates(YANDEX_APIKEY, obj.address)
-        if coords:
-            Location.objects.get_or_create(
-                address=obj.address,
-                defaults={**dict(zip(['latitude', 'longitude'], coords))},
-            )
-            return coords
+class OrdersPage(forms.Form):
+    after = forms.IntegerField(required=False, min_value=1)
+    page_size = forms.IntegerField(required=False, min_value=1, max_value=500)
+    stream = forms.BooleanField(required=False)
 
 
-@user_passes_test(is_manager, login_url='restaurateur:login')
-def view_orders(request):
-    sub = Location.objects.filter(address=OuterRef('address'))
-    orders = Order.objects\
-        .annotate(longitude=Subquery(sub.values('longitude')),
-                  latitude=Subquery(sub.values('latitude')))\
-        .for_managers()\
-        .order_by('restaurant_to_cook', '-pk')\
-        .fetch_restaurants_can_cook_order()
+def fetch_restaurants_to_order(orders, menu_index):
+    """Find the nearest restaurants able to cook each order, with distances.
 
+    Restaurants the index has no coordinates for are geocoded along with
+    the orders and measured directly, so the whole response is built from
+    one version of the index.
+    """
+    addresses = set()
     for order in orders:
-        order.coords = get_or_fetch_coords(order)
+        addresses.add(order.address)
+        addresses.update(
+            restaurant.address for restaurant in order.restaurants_can_cook_order
+            if not menu_index.is_located(restaurant)
+        )
+    coords = locate_addresses(addresses)
 
+    for order in orders:
         order.restaurants_to_order = []
-        if not order.restaurants_can_cook_order:
+        if order.address not in coords:
+            for restaurant in order.restaurants_can_cook_order:
+                order.restaurants_to_order.append([0, f'{restaurant} - Расстояние не определено'])
             continue
-        for restaurant in order.restaurants_can_cook_order:
-            restaurant.coords = get_or_fetch_coords(restaurant)
-            distance_to_client = round(distance(order.coords, restaurant.coords).km, 3)
-            if not distance_to_client:
-                order.restaurants_to_order.append([0, 'Расстояние не определено'])
-                continue
+        nearest_restaurants = menu_index.nearest_restaurants(
+            *coords[order.address],
+            k=settings.NEAREST_RESTAURANTS_COUNT,
+            restaurants=order.restaurants_can_cook_order,
+        )
+        unlocated_restaurants = [
+            restaurant for restaurant in order.restaurants_can_cook_order
+            if not menu_index.is_located(restaurant)
+        ]
+        located_now = [restaurant for restaurant in unlocated_restaurants if restaurant.address in coords]
+        if located_now:
+            distances = distance_matrix(
+                [coords[order.address]],
+                [coords[restaurant.address] for restaurant in located_now],
+            )[0]
+            nearest_restaurants = sorted(
+                nearest_restaurants + [
+                    (float(distance), restaurant) for distance, restaurant in zip(distances, located_now)
+                ],
+                key=lambda distance_and_restaurant: distance_and_restaurant[0],
+            )[:settings.NEAREST_RESTAURANTS_COUNT]
+        for distance_to_client, restaurant in nearest_restaurants:
+            distance_to_client = round(distance_to_client, 3)
             order.restaurants_to_order.append([distance_to_client, f'{restaurant} - {distance_to_client}'])
-        order.restaurants_to_order.sort(key=lambda distance: distance[0])
+        for restaurant in unlocated_restaurants:
+            if restaurant.address not in coords:
+                order.restaurants_to_order.append([0, f'{restaurant} - Расстояние не определено'])
+    return orders
+
+
+def fetch_orders_page(queue, after, page_size, menu_index):
+    """Return one page of the manager queue and the cursor of the next one.
+
+    The keyset scan reads only ids, page_size + 1 of them to know if there
+    is a next page. Costs are summed and capabilities computed for the
+    page itself, so the GROUP BY never runs over the whole queue.
+    """
+    if after:
+        queue = queue.filter(pk__lt=after)
+    page_ids = list(queue.values_list('pk', flat=True)[:page_size + 1])
+    next_after = page_ids[page_size - 1] if len(page_ids) > page_size else None
+    orders = Order.objects\
+        .annotate_order_cost()\
+        .filter(pk__in=page_ids[:page_size])\
+        .order_by('-pk')
+    return list(orders.fetch_restaurants_can_cook_order(menu_index)), next_after
+
+
+def stream_order_rows(request, queue, after, chunk_size):
+    """Render the orders page, emitting rows chunk by chunk as they are ready.
+
+    Chunks are read with the same keyset cursor as pages, so only one chunk
+    of orders is held in memory at a time.
+    """
+    page = render_to_string('order_items.html', request=request, context={'streaming': True})
+    page_head, page_tail = page.split(ORDER_ROWS_PLACEHOLDER)
+    yield page_head
+
+    while True:
+        menu_index = get_menu_index()
+        chunk, after = fetch_orders_page(queue, after, chunk_size, menu_index)
+        fetch_restaurants_to_order(chunk, menu_index)
+        yield ''.join(
+            render_to_string('order_item_row.html', request=request, context={'order': order})
+            for order in chunk
+        )
+        if not after:
+            break
+
+    yield page_tail
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_orders(request):
+    page = OrdersPage(request.GET)
+    page_params = page.cleaned_data if page.is_valid() else {}
+    page_size = page_params.get('page_size') or settings.ORDERS_PAGE_SIZE
+    after = page_params.get('after')
+    changes_cursor = (timezone.now(), 0)
+
+    # Orders for managers have no restaurant yet, so pk alone is a valid
+    # keyset cursor, read from the primary key index newest first.
+    queue = Order.objects\
+        .not_finished()\
+        .restaurant_not_picked()\
+        .order_by('-pk')
+
+    if page_params.get('stream'):
+        return StreamingHttpResponse(stream_order_rows(request, queue, after, chunk_size=page_size))
+
+    menu_index = get_menu_index()
+    orders, next_after = fetch_orders_page(queue, after, page_size, menu_index)
+    orders = fetch_restaurants_to_order(orders, menu_index)
 
     context = {
         'orders': orders,
+        'page_size': page_size,
+        'next_after': next_after,
+        'is_first_page': not after,
+        'changes_cursor': format_cursor(changes_cursor),
+        'order_events_sse': settings.ORDER_EVENTS_SSE,
+        'changes_poll_interval_ms': int(settings.ORDER_EVENTS_POLL_INTERVAL * 1000),
     }
     return render(request, template_name='order_items.html', context=context)
+
+
+def fetch_order_changes(request, since):
+    """Return a new cursor and the orders changed since the given one.
+
+    The cursor is an (updated_at, pk) pair, so the feed moves on even
+    when update() or bulk_update() stamp more than ORDER_CHANGES_LIMIT
+    orders with the same updated_at.
+
+    Orders still waiting for a manager come with a freshly rendered row,
+    orders that left the queue are marked as removed. Changes are found by
+    Order.updated_at, which OrderQuerySet.update() and bulk_update() bump
+    as well; deleted orders are not reported.
+    """
+    since_changed_at, since_order_id = since
+    changes = list(
+        Order.objects
+            .filter(
+                Q(updated_at__gt=since_changed_at)
+                | Q(updated_at=since_changed_at, pk__gt=since_order_id)
+            )
+            .order_by('updated_at', 'pk')
+            .values_list('updated_at', 'pk')[:ORDER_CHANGES_LIMIT]
+    )
+    if not changes:
+        return since, []
+
+    changed_ids = [order_id for _, order_id in changes]
+    menu_index = get_menu_index()
+    queued_orders = Order.objects\
+        .for_managers()\
+        .filter(pk__in=changed_ids)\
+        .fetch_restaurants_can_cook_order(menu_index)
+    queued_orders = {
+        order.id: order for order in fetch_restaurants_to_order(list(queued_orders), menu_index)
+    }
+
+    changed_orders = []
+    for order_id in changed_ids:
+        order = queued_orders.get(order_id)
+        if not order:
+            changed_orders.append({'id': order_id, 'removed': True})
+            continue
+        changed_orders.append({
+            'id': order_id,
+            'removed': False,
+            'status': order.status,
+            'html': render_to_string('order_item_row.html', request=request, context={'order': order}),
+        })
+    cursor = max(since, min(changes[-1], (timezone.now() - ORDER_CHANGES_OVERLAP, 0)))
+    return cursor, changed_orders
+
+
+def format_cursor(cursor):
+    changed_at, order_id = cursor
+    return f'{changed_at.isoformat()},{order_id}'
+
+
+def parse_cursor(cursor):
+    """Parse an `<updated_at>,<order id>` cursor; a bare updated_at starts before its first order."""
+    changed_at, _, order_id = (cursor or '').partition(',')
+    since = parse_datetime(changed_at)
+    if not since or not (order_id or '0').isdigit():
+        return None
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since, int(order_id or 0)
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_order_changes(request):
+    since = parse_cursor(request.GET.get('since'))
+    if not since:
+        return HttpResponseBadRequest('Укажите since — курсор из предыдущего ответа')
+
+    cursor, changed_orders = fetch_order_changes(request, since)
+    return JsonResponse({
+        'cursor': format_cursor(cursor),
+        'orders': changed_orders,
+    })
+
+
+def stream_order_events(request, since):
+    """Server-sent events with changed orders, polling the indexed updated_at.
+
+    The stream ends after ORDER_EVENTS_DURATION seconds; the browser
+    reconnects by itself and resumes from the Last-Event-ID it got. Every
+    open stream holds a worker all that time, so it is only served with
+    ORDER_EVENTS_SSE on, behind workers that can afford it.
+    """
+    started_at = time.monotonic()
+    while time.monotonic() - started_at < settings.ORDER_EVENTS_DURATION:
+        cursor, changed_orders = fetch_order_changes(request, since)
+        if changed_orders:
+            since = cursor
+            yield f'id: {format_cursor(cursor)}\nevent: orders\ndata: {json.dumps(changed_orders)}\n\n'
+        else:
+            yield ': keep-alive\n\n'
+        time.sleep(settings.ORDER_EVENTS_POLL_INTERVAL)
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_order_events(request):
+    if not settings.ORDER_EVENTS_SSE:
+        raise Http404('Поток изменений выключен, используйте orders/changes/')
+    since = parse_cursor(request.headers.get('Last-Event-ID') or request.GET.get('since'))
+    if not since:
+        return HttpResponseBadRequest('Укажите since — курсор из страницы заказов')
+
+    response = StreamingHttpResponse(stream_order_events(request, since), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_query_stats(request):
+    return JsonResponse(get_query_stats())
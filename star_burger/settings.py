@@ -33,6 +33,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodcartapp.query_stats.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -92,6 +93,13 @@ DATABASES = {
     )
 }
 
+CACHES = {
+    'default': env.dj_cache_url('CACHE_URL', 'locmem://'),
+}
+# A local-memory cache is private to every process, so a catalog change
+# made through one worker reaches the others only when their copy expires.
+CACHE_IS_SHARED = CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -130,6 +138,23 @@ STATICFILES_DIRS = [
 ]
 
 YANDEX_APIKEY = env('YANDEX_APIKEY')
+GEOCODER_MAX_WORKERS = env.int('GEOCODER_MAX_WORKERS', 8)
+GEOCODER_NOT_FOUND_TTL = env.int('GEOCODER_NOT_FOUND_TTL', 24)
+GEOCODER_RETRY_DELAY = env.int('GEOCODER_RETRY_DELAY', 60)
+LOCATION_MAX_AGE = env.int('LOCATION_MAX_AGE', 90)
+
+MENU_INDEX_MAX_AGE = env.int('MENU_INDEX_MAX_AGE', 60)
+NEAREST_RESTAURANTS_COUNT = env.int('NEAREST_RESTAURANTS_COUNT', 5)
+ORDERS_PAGE_SIZE = env.int('ORDERS_PAGE_SIZE', 50)
+CATALOG_CACHE_TIMEOUT = env.int('CATALOG_CACHE_TIMEOUT', 24 * 60 * 60 if CACHE_IS_SHARED else 60)
+PRODUCTS_PAGE_SIZE = env.int('PRODUCTS_PAGE_SIZE', 50)
+BANNERS_MAX_AGE = env.int('BANNERS_MAX_AGE', 60 * 60)
+IDEMPOTENCY_KEY_TTL = env.int('IDEMPOTENCY_KEY_TTL', 24)
+ORDERS_SPOOL = env.bool('ORDERS_SPOOL', False)
+ORDER_EVENTS_POLL_INTERVAL = env.float('ORDER_EVENTS_POLL_INTERVAL', 3)
+ORDER_EVENTS_SSE = env.bool('ORDER_EVENTS_SSE', False)
+ORDER_EVENTS_DURATION = env.int('ORDER_EVENTS_DURATION', 300)
+QUERY_BUDGET = env.int('QUERY_BUDGET', 50)
 
 if env('ROLLBAR_TOKEN', False):
     ROLLBAR = {